@@ -1,9 +1,34 @@
 """
 AWS Lambda handler: wraps Django ASGI app with Mangum for API Gateway / Lambda.
 Set AWS_LAMBDA_FUNCTION_HANDLER=handler.handler in the Lambda config.
+SQS events (background jobs, see mindpump/api/jobs.py) are dispatched to the job worker.
+
+Compressed responses (Content-Encoding: gzip/br) are always returned base64-encoded;
+a REST API needs binary media types set to */* so API Gateway decodes them.
 """
+import base64
+
 from mangum import Mangum
-from mindpump.asgi import application
+from mindpump.asgi import application  # sets up Django
+from mindpump.api import jobs
 
 # lifespan="off" avoids ASGI lifespan events Django doesn't use; recommended for Django
-handler = Mangum(application, api_gateway_base_path="/default/mindpump-api", lifespan="off")
+http_handler = Mangum(application, api_gateway_base_path="/default/mindpump-api", lifespan="off")
+
+
+def handler(event, context):
+    if jobs.is_sqs_event(event):
+        return jobs.handle_sqs_event(event)
+    return _encode_compressed_body(http_handler(event, context))
+
+
+def _encode_compressed_body(response):
+    """
+    Mangum sends a JSON body as text when it happens to decode as UTF-8, which a brotli
+    stream can; compressed bytes must go out as base64 to survive API Gateway.
+    """
+    headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+    if "content-encoding" in headers and not response.get("isBase64Encoded") and response.get("body"):
+        response["body"] = base64.b64encode(response["body"].encode("utf-8")).decode("ascii")
+        response["isBase64Encoded"] = True
+    return response
@@ -1,20 +1,170 @@
 from django.contrib import admin
-from .models import FlashcardSet, Flashcard
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from .models import FlashcardSet, Flashcard, CardProgress, Job, card_content_hash
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, an unfiltered changelist is counted from pg_class.reltuples
+    (summed over partitions) instead of COUNT(*), which scans the whole table.
+    Filtered changelists and other databases count normally.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if connection.vendor == "postgresql" and query is not None and not query.where:
+            estimate = _estimated_row_count(self.object_list.model._meta.db_table)
+            if estimate is not None:
+                return estimate
+        return super().count
+
+
+def _estimated_row_count(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT SUM(GREATEST(c.reltuples, 0))::bigint, BOOL_OR(c.reltuples >= 0) "
+            "FROM pg_class c WHERE c.oid = %s::regclass "
+            "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+            [table, table],
+        )
+        estimate, analyzed = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed/analyzed.
+    return estimate if analyzed else None
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    List filter rendered as a text box (an id) instead of one link per related row,
+    which doesn't scale past a handful of rows. Subclasses set parameter_name and field.
+    """
+
+    template = "admin/input_filter.html"
+    field = None
+    placeholder = "id"
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(**{self.field: int(value)})
+
+    def choices(self, changelist):
+        yield {
+            "parameter_name": self.parameter_name,
+            "value": self.value(),
+            "placeholder": self.placeholder,
+            "hidden_params": {
+                k: v for k, v in changelist.params.items() if k != self.parameter_name
+            },
+            "clear_query_string": changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+class SetFilter(InputFilter):
+    title = "set id"
+    parameter_name = "set_id"
+    field = "set_id"
+
+
+class UserFilter(InputFilter):
+    title = "user id"
+    parameter_name = "user_id"
+    field = "user_id"
+
+
+class OwnerFilter(InputFilter):
+    title = "owner id"
+    parameter_name = "owner_id"
+    field = "owner_id"
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist defaults for large tables: estimated counts, no second full COUNT(*)."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def _is_changelist(request):
+    match = getattr(request, "resolver_match", None)
+    return match is not None and match.url_name.endswith("_changelist")
 
 
 @admin.register(FlashcardSet)
-class FlashcardSetAdmin(admin.ModelAdmin):
-    list_display = ["name", "user", "created_at", "updated_at"]
-    list_filter = ["user"]
+class FlashcardSetAdmin(ScalableAdmin):
+    list_display = ["name", "user", "card_count", "is_shared", "created_at", "updated_at"]
+    list_filter = [UserFilter, "is_shared"]
+    list_select_related = ["user"]
     raw_id_fields = ["user"]
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if _is_changelist(request):
+            # One grouped query for the page instead of a COUNT per row.
+            queryset = queryset.annotate(_card_count=Count("cards"))
+        return queryset
+
+    @admin.display(description="Cards", ordering="_card_count")
+    def card_count(self, obj):
+        return getattr(obj, "_card_count", None)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "user" in form.changed_data:
+            # Keep the cards' denormalized owner (partition key) in step with the set.
+            Flashcard.objects.filter(set=obj).update(owner_id=obj.user_id)
+
 
 @admin.register(Flashcard)
-class FlashcardAdmin(admin.ModelAdmin):
-    list_display = ["id", "set", "front_preview", "interval_days", "due_at", "reps", "lapses"]
-    list_filter = ["set"]
+class FlashcardAdmin(ScalableAdmin):
+    list_display = ["id", "set", "front_preview", "created_at", "updated_at"]
+    list_filter = [SetFilter, OwnerFilter]
+    list_select_related = ["set"]
     raw_id_fields = ["set"]
+    # Derived from set and front/back on save, as the repository does.
+    readonly_fields = ["owner", "content_hash"]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if _is_changelist(request):
+            # Only the front is shown (and used by __str__); skip the rest of the text.
+            queryset = queryset.defer("back", "content_hash")
+        return queryset
+
+    def save_model(self, request, obj, form, change):
+        obj.owner_id = obj.set.user_id
+        obj.content_hash = card_content_hash(obj.front, obj.back)
+        super().save_model(request, obj, form, change)
 
     def front_preview(self, obj):
         return (obj.front[:50] + "...") if len(obj.front) > 50 else obj.front
     front_preview.short_description = "Front"
+
+
+@admin.register(CardProgress)
+class CardProgressAdmin(ScalableAdmin):
+    list_display = ["id", "user", "card_id", "interval_days", "due_at", "reps", "lapses"]
+    list_filter = [UserFilter]
+    list_select_related = ["user"]
+    raw_id_fields = ["user", "card"]
+
+
+@admin.register(Job)
+class JobAdmin(ScalableAdmin):
+    list_display = ["id", "kind", "status", "user", "progress", "total", "created_at", "finished_at"]
+    list_filter = ["kind", "status"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    exclude = ["params"]
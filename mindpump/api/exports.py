@@ -0,0 +1,60 @@
+"""
+Set exports: the set detail payload (set fields plus every card with the user's
+progress and media), read and encoded EXPORT_CHUNK_SIZE cards at a time, so only one
+chunk of model instances is alive at once. GET /api/sets/:id/export/ returns it as a
+streaming response, but on Lambda Mangum buffers the whole (compressed) body before
+replying, so it is bounded by the response size limit; the export_set job writes it to
+storage instead, spooling to disk past SPOOL_MAX_BYTES.
+"""
+import tempfile
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .media_storage import get_media_storage
+from .repositories import CardMediaRepository, CardProgressRepository, FlashcardRepository
+from .serializers import FlashcardSerializer, FlashcardSetListSerializer
+
+# An export job buffers its file in memory up to this size, then spills to disk.
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+def iter_set_json(flashcard_set, user, on_progress=None):
+    """
+    Yield the JSON for a set and its cards as bytes, EXPORT_CHUNK_SIZE cards at a time.
+    on_progress(n) is called with the number of cards written after each chunk.
+    """
+    encoder = JSONEncoder()
+    # Same fields as the set detail payload; "cards" is spliced in as a streamed array.
+    header = encoder.encode(FlashcardSetListSerializer(flashcard_set).data)
+    yield header[:-1].encode() + b', "cards": ['
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    last_id = 0
+    written = 0
+    while True:
+        # Keyset pagination on id: each chunk is an indexed range read.
+        cards = list(FlashcardRepository.list_by_set(flashcard_set).filter(pk__gt=last_id)[:chunk_size])
+        if not cards:
+            break
+        CardProgressRepository.attach(cards, user)
+        CardMediaRepository.attach(cards)
+        body = ", ".join(encoder.encode(card) for card in FlashcardSerializer(cards, many=True).data)
+        yield (body if not written else ", " + body).encode()
+        written += len(cards)
+        last_id = cards[-1].pk
+        if on_progress is not None:
+            on_progress(written)
+    yield b"]}"
+
+
+def export_key(job_id, flashcard_set):
+    return f"{settings.EXPORT_KEY_PREFIX}{job_id}/set-{flashcard_set.pk}.json"
+
+
+def write_export(key, flashcard_set, user, on_progress=None):
+    """Write a set's export to object storage under key."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+        for chunk in iter_set_json(flashcard_set, user, on_progress):
+            buffer.write(chunk)
+        buffer.seek(0)
+        get_media_storage().put(key, buffer, content_type="application/json")
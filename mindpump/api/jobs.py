@@ -0,0 +1,207 @@
+"""
+Background jobs for operations too long for one API Gateway/Lambda request.
+
+A view creates a Job row and enqueues its id on the configured backend
+(settings.JOBS_BACKEND):
+
+- SQSBackend: sends {"job_id": ...} to settings.JOBS_QUEUE_URL. The Lambda handler
+  (handler.py) receives the SQS event and calls handle_sqs_event().
+- DatabaseBackend: the Job row is the queue; `manage.py run_jobs` works it off.
+- InlineBackend: runs the job in-process right after the request's transaction
+  commits (local dev and tests).
+
+With no JOBS_BACKEND there is no worker: views run large operations inline instead of
+enqueuing them (see backend_configured()), and jobs that are still enqueued, such as
+set exports, use InlineBackend.
+
+Clients poll GET /api/jobs/:id/ for status and progress. Handlers: import_cards,
+clone_set and export_set.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .exports import export_key, write_export
+from .media_storage import copy_clone_media
+from .repositories.flashcard_repository import ON_DUPLICATE_ALLOW
+from .repositories import (
+    FlashcardRepository,
+    FlashcardSetRepository,
+    JobRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+KIND_IMPORT_CARDS = "import_cards"
+KIND_CLONE_SET = "clone_set"
+KIND_EXPORT_SET = "export_set"
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register fn(job) as the handler for a job kind. Its return value is the job result."""
+
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def enqueue(user, kind, params, *, total=0):
+    """Create a job and hand it to the backend once the current transaction commits."""
+    job = JobRepository.create(user, kind, params, total=total)
+    backend = get_backend()
+    transaction.on_commit(lambda: backend.enqueue(job.pk))
+    return job
+
+
+def run_job(job_id):
+    """
+    Run one job. Safe to call twice for the same id (e.g. SQS redelivery). A job left
+    running for JOBS_STALE_SECONDS without progress (its worker died) is run again.
+    """
+    if not JobRepository.claim(job_id, stale_before=stale_before()):
+        return None
+    job = JobRepository.get_by_id(job_id)
+    try:
+        result = _handlers[job.kind](job)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        return JobRepository.finish(job, error=str(exc) or exc.__class__.__name__)
+    return JobRepository.finish(job, result=result)
+
+
+def handle_sqs_event(event):
+    """
+    Lambda entry point for SQS events (see handler.py). A message for a job that is
+    still running elsewhere is reported as failed, so SQS redelivers it after the
+    visibility timeout; by then the job has finished or gone stale and is reclaimed.
+    Needs ReportBatchItemFailures on the event source mapping.
+    """
+    # No request_started/finished signals on this path: drop broken or expired
+    # connections ourselves, as Django does around each request.
+    close_old_connections()
+    failures = []
+    try:
+        for record in event.get("Records", []):
+            job_id = json.loads(record["body"])["job_id"]
+            if run_job(job_id) is None:
+                job = JobRepository.get_by_id(job_id)
+                if job is not None and job.status == job.STATUS_RUNNING:
+                    failures.append({"itemIdentifier": record["messageId"]})
+    finally:
+        close_old_connections()
+    return {"batchItemFailures": failures}
+
+
+def stale_before():
+    """Running jobs last updated before this are assumed abandoned."""
+    return timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+
+
+def is_sqs_event(event):
+    records = event.get("Records") if isinstance(event, dict) else None
+    return bool(records) and records[0].get("eventSource") == "aws:sqs"
+
+
+def backend_configured():
+    """True if JOBS_BACKEND names a backend; views only hand work off to jobs then."""
+    return bool(settings.JOBS_BACKEND)
+
+
+def get_backend():
+    return import_string(settings.JOBS_BACKEND or "mindpump.api.jobs.InlineBackend")()
+
+
+class InlineBackend:
+    def enqueue(self, job_id):
+        run_job(job_id)
+
+
+class DatabaseBackend:
+    """Jobs stay queued in the database until `manage.py run_jobs` picks them up."""
+
+    def enqueue(self, job_id):
+        pass
+
+
+class SQSBackend:
+    def __init__(self):
+        import boto3
+
+        self.client = boto3.client("sqs")
+
+    def enqueue(self, job_id):
+        self.client.send_message(
+            QueueUrl=settings.JOBS_QUEUE_URL,
+            MessageBody=json.dumps({"job_id": job_id}),
+        )
+
+
+# --- Handlers ---
+
+
+@job_handler(KIND_IMPORT_CARDS)
+def import_cards(job):
+    """
+    params: { set_id, cards: [ { front, back }, ... ], on_duplicate? }
+    Progress is committed with each chunk, so a reclaimed job resumes after the last
+    chunk written; "written" then counts the cards written by the final run.
+    """
+    flashcard_set = FlashcardSetRepository.get_by_id_and_user(
+        job.params["set_id"], job.user, prefetch_cards=False
+    )
+    if flashcard_set is None:
+        raise ValueError("Set not found.")
+    cards = job.params["cards"]
+    chunk_size = settings.JOBS_CHUNK_SIZE
+    written = 0
+    for start in range(job.progress, len(cards), chunk_size):
+        with transaction.atomic():
+            written += len(
+                FlashcardRepository.create_many(
+                    flashcard_set,
+                    cards[start:start + chunk_size],
+                    on_duplicate=job.params.get("on_duplicate", ON_DUPLICATE_ALLOW),
+                )
+            )
+            JobRepository.set_progress(job, min(start + chunk_size, len(cards)))
+    return {"set_id": flashcard_set.pk, "written": written}
+
+
+@job_handler(KIND_CLONE_SET)
+def clone_set(job):
+    """params: { set_id, name?, reset_study? }"""
+    flashcard_set = FlashcardSetRepository.get_by_id_and_user(
+        job.params["set_id"], job.user, include_shared=True, prefetch_cards=False
+    )
+    if flashcard_set is None:
+        raise ValueError("Set not found.")
+    new_set = FlashcardSetRepository.clone(
+        flashcard_set,
+        job.user,
+        name=job.params.get("name"),
+        reset_study=job.params.get("reset_study", False),
+    )
+    copy_clone_media(flashcard_set, new_set, job.user)
+    return {"set_id": new_set.pk}
+
+
+@job_handler(KIND_EXPORT_SET)
+def export_set(job):
+    """params: { set_id }. Writes the set export to object storage; result has its key."""
+    flashcard_set = FlashcardSetRepository.get_by_id_and_user(
+        job.params["set_id"], job.user, include_shared=True, prefetch_cards=False
+    )
+    if flashcard_set is None:
+        raise ValueError("Set not found.")
+    key = export_key(job.pk, flashcard_set)
+    write_export(key, flashcard_set, job.user, lambda n: JobRepository.set_progress(job, n))
+    return {"set_id": flashcard_set.pk, "key": key}
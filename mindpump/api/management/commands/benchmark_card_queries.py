@@ -0,0 +1,74 @@
+"""
+Time the per-user repository queries, e.g. before and after partition_flashcards:
+
+    python manage.py benchmark_card_queries --user-id 42 --iterations 100
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from mindpump.api.repositories import FlashcardRepository, FlashcardSetRepository
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-user card queries (latency in ms)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="Defaults to the user with the most sets.")
+        parser.add_argument("--iterations", type=int, default=50)
+
+    def handle(self, *args, **options):
+        user = self._get_user(options["user_id"])
+        flashcard_set = FlashcardSetRepository.list_by_user(user).first()
+        if flashcard_set is None:
+            raise CommandError(f"User {user.pk} has no sets.")
+
+        queries = {
+            "list_by_user": lambda: list(FlashcardSetRepository.list_by_user(user)),
+            "get_by_id_and_user": lambda: FlashcardSetRepository.get_by_id_and_user(
+                flashcard_set.pk, user
+            ),
+            "list_by_set": lambda: list(FlashcardRepository.list_by_set(flashcard_set)),
+        }
+        self.stdout.write(f"user={user.pk} set={flashcard_set.pk} iterations={options['iterations']}")
+        for name, query in queries.items():
+            timings = _time(query, options["iterations"])
+            self.stdout.write(
+                f"{name:<20} mean={statistics.mean(timings):8.2f}  "
+                f"p50={statistics.median(timings):8.2f}  "
+                f"p95={_percentile(timings, 95):8.2f}"
+            )
+
+    def _get_user(self, user_id):
+        if user_id is not None:
+            try:
+                return User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                raise CommandError(f"User {user_id} does not exist.")
+        user = (
+            User.objects.annotate(n=Count("flashcard_sets")).order_by("-n").first()
+        )
+        if user is None:
+            raise CommandError("No users.")
+        return user
+
+
+def _time(query, iterations):
+    query()  # warm up connection and caches
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
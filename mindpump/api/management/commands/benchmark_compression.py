@@ -0,0 +1,66 @@
+"""
+Bytes saved and CPU cost of response compression for set detail payloads:
+
+    python manage.py benchmark_compression --cards 1000 10000
+
+Payloads are synthetic FlashcardSetSerializer-shaped JSON; no database needed.
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from mindpump.middleware import brotli, compress
+
+
+class Command(BaseCommand):
+    help = "Benchmark gzip/brotli response compression for large decks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, nargs="+", default=[1000, 10000])
+        parser.add_argument("--iterations", type=int, default=10)
+
+    def handle(self, *args, **options):
+        encodings = ["gzip"] + (["br"] if brotli is not None else [])
+        self.stdout.write(f"{'cards':>7} {'encoding':>8} {'bytes':>10} {'ratio':>6} {'ms/req':>8}")
+        for count in options["cards"]:
+            payload = json.dumps(_deck(count)).encode()
+            self.stdout.write(f"{count:>7} {'identity':>8} {len(payload):>10} {1:>6.2f} {0:>8.2f}")
+            for encoding in encodings:
+                start = time.perf_counter()
+                for _ in range(options["iterations"]):
+                    compressed = compress(payload, encoding)
+                elapsed = (time.perf_counter() - start) * 1000 / options["iterations"]
+                ratio = len(compressed) / len(payload)
+                self.stdout.write(
+                    f"{count:>7} {encoding:>8} {len(compressed):>10} {ratio:>6.2f} {elapsed:>8.2f}"
+                )
+
+
+def _deck(count):
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return {
+        "id": 1,
+        "name": "Benchmark deck",
+        "description": "",
+        "is_shared": False,
+        "card_count": count,
+        "cards": [
+            {
+                "id": i,
+                "front": f"What is the term for concept number {i}?",
+                "back": f"Concept {i} is defined as the {i % 97}th example of a longer explanation.",
+                "interval_days": i % 30,
+                "ease_factor": 2.5 - (i % 7) / 10,
+                "due_at": now if i % 3 else None,
+                "lapses": i % 4,
+                "reps": i % 12,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(1, count + 1)
+        ],
+        "created_at": now,
+        "updated_at": now,
+    }
@@ -0,0 +1,365 @@
+"""
+Guard repository queries against plan regressions. Seeds a throwaway test database,
+runs every repository method, EXPLAINs each statement it issues and compares the
+normalized plans and query counts with mindpump/api/query_plans/<vendor>.json:
+
+    python manage.py check_query_plans            # exit 1 on a regression
+    python manage.py check_query_plans --update   # rewrite the snapshot
+
+A full scan (of a table, or of a whole index) not listed in ALLOWED_FULL_SCANS or a
+changed query count is a regression; other plan changes are reported but pass. Review
+snapshot diffs like code. QueryPlanTests in mindpump/api/tests.py runs the same check.
+"""
+import json
+import re
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mindpump.api.models import CardMedia, CardProgress, Flashcard, FlashcardSet, Job, card_content_hash
+from mindpump.api.repositories import (
+    CardMediaRepository,
+    CardProgressRepository,
+    FlashcardRepository,
+    FlashcardSetRepository,
+    JobRepository,
+    UserRepository,
+)
+
+User = get_user_model()
+
+SNAPSHOT_DIR = Path(__file__).resolve().parents[2] / "query_plans"
+
+# Seed size: large enough that the planner prefers indexes where they exist.
+SEED_USERS = 20
+SEED_SETS_PER_USER = 5
+SEED_CARDS_PER_SET = 100
+SEED_JOBS = 2000
+
+# pk__in size for the bulk card operations.
+BULK_IDS = 600
+
+# case -> full scans it may do, as "<table>" or "<table> using <index>" (see
+# _full_scans). Every entry needs a comment saying why the scan is bounded; a snapshot
+# alone never makes a scan acceptable.
+ALLOWED_FULL_SCANS = {
+    # Partial index holding shared sets only, read in updated_at order; the view pages
+    # it with a cursor, so each request stops after SHARED_SETS_PAGE_SIZE entries.
+    "FlashcardSetRepository.list_shared": {"api_flashcardset using flashcardset_shared_idx"},
+    # Partial index holding queued and running jobs only, read oldest first up to limit.
+    "JobRepository.next_queued_ids": {"api_job using job_claimable_idx"},
+    "JobRepository.next_queued_ids[stale]": {"api_job using job_claimable_idx"},
+}
+
+# Statements that have no plan worth recording.
+_SKIP_EXPLAIN = re.compile(r"^\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b", re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = "Compare repository query plans and query counts with the committed snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--update", action="store_true", help="Write the snapshot instead of checking it.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAINERS:
+            raise CommandError(f"No EXPLAIN support for {connection.vendor}.")
+        path = SNAPSHOT_DIR / f"{connection.vendor}.json"
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            plans = _capture_plans()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["update"]:
+            SNAPSHOT_DIR.mkdir(exist_ok=True)
+            path.write_text(json.dumps(plans, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(plans)} plans to {path}."))
+            return
+
+        if not path.exists():
+            raise CommandError(f"No snapshot at {path}; run with --update first.")
+        expected = json.loads(path.read_text())
+        regressions, changes = _compare(expected, plans)
+        for line in changes:
+            self.stdout.write(self.style.WARNING(line))
+        for line in regressions:
+            self.stderr.write(self.style.ERROR(line))
+        if regressions:
+            raise CommandError(f"{len(regressions)} query plan regression(s); see above.")
+        self.stdout.write(self.style.SUCCESS(f"{len(plans)} query plans match {path.name}."))
+
+
+def _capture_plans():
+    """{case: {"queries": n, "plans": [[plan line, ...] per statement]}}, rolled back."""
+    explain = EXPLAINERS[connection.vendor]
+    plans = {}
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            # The seed is small next to production; only use a seq scan when no index fits.
+            # Without one, Postgres may then walk a whole index instead, which the plan
+            # lines record as a full index scan (see _explain_postgresql).
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        seeded = _seed()
+        for name in _cases(_load(seeded)):
+            # Reload per case: a case may delete or mutate the instances it is given.
+            case = _cases(_load(seeded))[name]
+            savepoint = transaction.savepoint()
+            with CaptureQueriesContext(connection) as captured:
+                case()
+            statements = [q["sql"] for q in captured.captured_queries if not _SKIP_EXPLAIN.match(q["sql"])]
+            plans[name] = {
+                "queries": len(statements),
+                "plans": [explain(sql) for sql in statements],
+            }
+            transaction.savepoint_rollback(savepoint)
+        transaction.set_rollback(True)
+    return plans
+
+
+def _seed():
+    now = timezone.now()
+    users = User.objects.bulk_create(
+        User(username=f"plan-user-{i}") for i in range(SEED_USERS)
+    )
+    sets = FlashcardSet.objects.bulk_create(
+        FlashcardSet(user=user, name=f"set {i}", is_shared=i == 0)
+        for user in users
+        for i in range(SEED_SETS_PER_USER)
+    )
+    Flashcard.objects.bulk_create(
+        Flashcard(
+            set=s,
+            owner_id=s.user_id,
+            front=f"front {s.pk}-{i}",
+            back=f"back {s.pk}-{i}",
+            content_hash=card_content_hash(f"front {s.pk}-{i}", f"back {s.pk}-{i}"),
+        )
+        for s in sets
+        for i in range(SEED_CARDS_PER_SET)
+    )
+    cards = list(Flashcard.objects.order_by("id"))
+    CardProgress.objects.bulk_create(
+        CardProgress(user_id=card.owner_id, card=card, due_at=now) for card in cards[::2]
+    )
+    CardMedia.objects.bulk_create(
+        CardMedia(
+            card=card,
+            owner_id=card.owner_id,
+            key=f"plans/{card.pk}",
+            content_type="image/png",
+            size=1,
+            status=CardMedia.STATUS_READY if i % 2 else CardMedia.STATUS_PENDING,
+        )
+        for i, card in enumerate(cards)
+    )
+    # Mostly finished jobs, as in production: a few queued, fewer running.
+    Job.objects.bulk_create(
+        Job(
+            user=users[i % SEED_USERS],
+            kind="import_cards",
+            params={},
+            status=(
+                Job.STATUS_QUEUED
+                if i % 20 == 0
+                else Job.STATUS_RUNNING if i % 50 == 1 else Job.STATUS_SUCCEEDED
+            ),
+        )
+        for i in range(SEED_JOBS)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    user = users[0]
+    # A clone of source whose cards line up with source's, for copy_to_clone.
+    clone = FlashcardSetRepository.clone(sets[0], user)
+    return {
+        "user": user.pk,
+        "source": sets[0].pk,
+        "target": sets[1].pk,
+        "clone": clone.pk,
+        "other_shared": sets[SEED_SETS_PER_USER].pk,
+        "card": Flashcard.objects.filter(set=sets[0]).first().pk,
+        "media": CardMedia.objects.filter(owner=user).first().pk,
+        "job": Job.objects.filter(user=user).first().pk,
+        "bulk_ids": [c.pk for c in cards if c.owner_id == user.pk][:BULK_IDS],
+        "keys": [f"plans/{c.pk}" for c in cards[:BULK_IDS:10]],
+    }
+
+
+def _load(seeded):
+    """Fresh instances for the pks returned by _seed()."""
+    return {
+        **seeded,
+        "user": User.objects.get(pk=seeded["user"]),
+        "source": FlashcardSet.objects.get(pk=seeded["source"]),
+        "target": FlashcardSet.objects.get(pk=seeded["target"]),
+        "clone": FlashcardSet.objects.get(pk=seeded["clone"]),
+        "other_shared": FlashcardSet.objects.get(pk=seeded["other_shared"]),
+        "card": Flashcard.objects.get(pk=seeded["card"]),
+        "media": CardMedia.objects.get(pk=seeded["media"]),
+        "job": Job.objects.get(pk=seeded["job"]),
+    }
+
+
+def _cases(f):
+    """One entry per repository method; each is run in its own savepoint on fresh fixtures."""
+    user, source, target, card = f["user"], f["source"], f["target"], f["card"]
+    source_ids = list(FlashcardRepository.cards_of(source).values_list("pk", flat=True))
+    items = [{"front": f"new {i}", "back": "b"} for i in range(10)]
+    duplicates = [{"front": c.front, "back": c.back} for c in FlashcardRepository.list_by_set(source)[:10]]
+    study = [{"id": pk, "reps": 1} for pk in source_ids]
+    pending = list(CardMedia.objects.filter(owner=user, status=CardMedia.STATUS_PENDING)[:10])
+    now = timezone.now()
+    return {
+        "UserRepository.get_by_id": lambda: UserRepository.get_by_id(user.pk),
+        "FlashcardSetRepository.list_by_user": lambda: list(FlashcardSetRepository.list_by_user(user)),
+        "FlashcardSetRepository.list_shared": lambda: list(FlashcardSetRepository.list_shared()),
+        "FlashcardSetRepository.get_by_id_and_user": lambda: FlashcardSetRepository.get_by_id_and_user(
+            source.pk, user
+        ),
+        "FlashcardSetRepository.get_by_id_and_user[shared]": lambda: FlashcardSetRepository.get_by_id_and_user(
+            f["other_shared"].pk, user, include_shared=True
+        ),
+        "FlashcardSetRepository.create": lambda: FlashcardSetRepository.create(user, name="new"),
+        "FlashcardSetRepository.update": lambda: FlashcardSetRepository.update(source, name="renamed"),
+        "FlashcardSetRepository.delete": lambda: FlashcardSetRepository.delete(target),
+        "FlashcardSetRepository.clone": lambda: FlashcardSetRepository.clone(source, user),
+        "FlashcardRepository.list_by_set": lambda: list(FlashcardRepository.list_by_set(source)),
+        "FlashcardRepository.get_by_id": lambda: FlashcardRepository.get_by_id(card.pk, owner=user),
+        "FlashcardRepository.create": lambda: FlashcardRepository.create(source, front="f", back="b"),
+        "FlashcardRepository.create_many[skip]": lambda: FlashcardRepository.create_many(
+            source, duplicates + items, on_duplicate="skip"
+        ),
+        "FlashcardRepository.update": lambda: FlashcardRepository.update(card, front="changed"),
+        "FlashcardRepository.update_batch": lambda: FlashcardRepository.update_batch(
+            source, [{"id": pk, "back": "changed"} for pk in source_ids[:10]]
+        ),
+        "FlashcardRepository.delete_many": lambda: FlashcardRepository.delete_many(source, f["bulk_ids"]),
+        "FlashcardRepository.move_many": lambda: FlashcardRepository.move_many(source, target, f["bulk_ids"]),
+        "CardProgressRepository.attach": lambda: CardProgressRepository.attach(
+            FlashcardRepository.list_by_set(source), user
+        ),
+        "CardProgressRepository.update": lambda: CardProgressRepository.update(card, user, {"reps": 3}),
+        "CardProgressRepository.update_batch": lambda: CardProgressRepository.update_batch(source, user, study),
+        "CardMediaRepository.attach": lambda: CardMediaRepository.attach(FlashcardRepository.list_by_set(source)),
+        "CardMediaRepository.create": lambda: CardMediaRepository.create(card, user, content_type="image/png", size=1),
+        "CardMediaRepository.get_by_id": lambda: CardMediaRepository.get_by_id(f["media"].pk),
+        "CardMediaRepository.copy_to_clone": lambda: CardMediaRepository.copy_to_clone(source, f["clone"], user),
+        "CardMediaRepository.mark_ready": lambda: CardMediaRepository.mark_ready(f["media"], 2),
+        "CardMediaRepository.mark_ready_many": lambda: CardMediaRepository.mark_ready_many(pending),
+        "CardMediaRepository.delete": lambda: CardMediaRepository.delete(f["media"]),
+        "CardMediaRepository.list_stale_pending": lambda: list(
+            CardMediaRepository.list_stale_pending(now - timedelta(hours=1))
+        ),
+        "CardMediaRepository.existing_keys": lambda: CardMediaRepository.existing_keys(f["keys"]),
+        "JobRepository.create": lambda: JobRepository.create(user, "import_cards", {}),
+        "JobRepository.get_by_id": lambda: JobRepository.get_by_id(f["job"].pk),
+        "JobRepository.get_by_id_and_user": lambda: JobRepository.get_by_id_and_user(f["job"].pk, user),
+        "JobRepository.claim": lambda: JobRepository.claim(f["job"].pk),
+        "JobRepository.next_queued_ids": lambda: JobRepository.next_queued_ids(10),
+        "JobRepository.next_queued_ids[stale]": lambda: JobRepository.next_queued_ids(
+            10, stale_before=now - timedelta(hours=1)
+        ),
+        "JobRepository.set_progress": lambda: JobRepository.set_progress(f["job"], 1),
+        "JobRepository.finish": lambda: JobRepository.finish(f["job"], result={}),
+    }
+
+
+def _explain_sqlite(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        rows = cursor.fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + _normalize(detail))
+    return lines
+
+
+def _explain_postgresql(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (COSTS OFF, FORMAT JSON) {sql}")
+        (plan,) = cursor.fetchone()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines = []
+
+    def walk(node, depth):
+        line = node["Node Type"]
+        if "Relation Name" in node:
+            line += f" on {node['Relation Name']}"
+        if "Index Name" in node:
+            line += f" using {node['Index Name']}"
+            if "Index Cond" not in node:
+                # Reads the whole index (e.g. only for its order), like a seq scan.
+                line += " (full)"
+        lines.append("  " * depth + line)
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(plan[0]["Plan"], 0)
+    return lines
+
+
+EXPLAINERS = {"sqlite": _explain_sqlite, "postgresql": _explain_postgresql}
+
+
+def _normalize(detail):
+    # Subquery/CTE numbering depends on statement shape only, but literals can leak in.
+    return re.sub(r"\b\d+\b", "N", detail)
+
+
+_SCAN_PATTERNS = [
+    # SQLite: "SCAN t", "SCAN t USING [COVERING] INDEX i" (every row of t or of i).
+    re.compile(r"SCAN (?P<table>\w+)(?: USING (?:COVERING )?INDEX (?P<index>\w+))?$"),
+    # Postgres: a Seq Scan, or an index node without an Index Cond (marked "(full)").
+    re.compile(r"Seq Scan on (?P<table>\w+)$"),
+    re.compile(r"(?:Index|Index Only) Scan on (?P<table>\w+) using (?P<index>\w+) \(full\)$"),
+]
+
+
+def _full_scans(plans):
+    """
+    Full scans, as "<table>" or "<table> using <index>". Scans of a CTE the same
+    statement materialized (SQLite "MATERIALIZE <name>") read that statement's own
+    intermediate rows, not a table, and are not counted.
+    """
+    scans = set()
+    for plan in plans:
+        lines = [line.strip() for line in plan]
+        materialized = {line.split()[1] for line in lines if line.startswith("MATERIALIZE ")}
+        for line in lines:
+            for pattern in _SCAN_PATTERNS:
+                match = pattern.match(line)
+                if match and match["table"] not in materialized:
+                    index = match.groupdict().get("index")
+                    scans.add(f"{match['table']} using {index}" if index else match["table"])
+    return scans
+
+
+def _compare(expected, actual):
+    regressions, changes = [], []
+    for name in sorted(expected.keys() - actual.keys()):
+        changes.append(f"{name}: no longer checked")
+    for name, current in sorted(actual.items()):
+        previous = expected.get(name)
+        if previous is None:
+            regressions.append(f"{name}: not in snapshot; run with --update")
+            continue
+        if current["queries"] != previous["queries"]:
+            regressions.append(f"{name}: {previous['queries']} queries -> {current['queries']}")
+        scans = _full_scans(current["plans"]) - ALLOWED_FULL_SCANS.get(name, set())
+        if scans:
+            regressions.append(f"{name}: full scan of {', '.join(sorted(scans))}")
+        elif current["plans"] != previous["plans"]:
+            changes.append(f"{name}: plan changed")
+    return regressions, changes
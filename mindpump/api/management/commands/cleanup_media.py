@@ -0,0 +1,52 @@
+"""
+Remove orphaned card media:
+
+- pending uploads older than MEDIA_PENDING_TTL_HOURS (never completed), and
+- objects under MEDIA_KEY_PREFIX with no CardMedia row (e.g. their card was deleted).
+
+    python manage.py cleanup_media [--dry-run]
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mindpump.api.media_storage import DELETE_BATCH_SIZE, get_media_storage
+from mindpump.api.repositories import CardMediaRepository
+
+
+class Command(BaseCommand):
+    help = "Delete stale pending uploads and media objects no card references."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report without deleting.")
+
+    def handle(self, *args, **options):
+        storage = get_media_storage()
+        dry_run = options["dry_run"]
+
+        before = timezone.now() - timedelta(hours=settings.MEDIA_PENDING_TTL_HOURS)
+        stale = CardMediaRepository.list_stale_pending(before)
+        stale_keys = list(stale.values_list("key", flat=True))
+        if not dry_run and stale_keys:
+            storage.delete(stale_keys)
+            stale.delete()
+        self.stdout.write(f"Stale pending uploads: {len(stale_keys)}")
+
+        orphaned = 0
+        batch = []
+        for key in storage.iter_keys(settings.MEDIA_KEY_PREFIX):
+            batch.append(key)
+            if len(batch) >= DELETE_BATCH_SIZE:
+                orphaned += self._delete_orphans(storage, batch, dry_run)
+                batch = []
+        if batch:
+            orphaned += self._delete_orphans(storage, batch, dry_run)
+        self.stdout.write(f"Orphaned objects: {orphaned}")
+
+    def _delete_orphans(self, storage, keys, dry_run):
+        orphans = set(keys) - CardMediaRepository.existing_keys(keys)
+        if orphans and not dry_run:
+            storage.delete(orphans)
+        return len(orphans)
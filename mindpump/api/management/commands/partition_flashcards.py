@@ -0,0 +1,120 @@
+"""
+Convert api_flashcard into a table hash-partitioned by owner_id (PostgreSQL only).
+
+    python manage.py benchmark_card_queries          # baseline
+    python manage.py partition_flashcards --partitions 16
+    python manage.py benchmark_card_queries          # compare
+
+Run after `migrate`, in a maintenance window: rows are copied inside one transaction.
+Postgres cannot enforce a unique key on id alone across partitions, so foreign keys
+that reference api_flashcard (e.g. CardProgress.card) are dropped; Django still
+cascades deletes through the ORM. Later migrations that add such a foreign key need
+db_constraint=False or must run before this command.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from mindpump.api.models import Flashcard
+
+
+class Command(BaseCommand):
+    help = "Hash-partition the flashcard table by owner_id (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partitions", type=int, default=16)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the SQL instead of executing it.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on PostgreSQL.")
+        partitions = options["partitions"]
+        if partitions < 1:
+            raise CommandError("--partitions must be at least 1.")
+        table = Flashcard._meta.db_table
+        if _is_partitioned(table):
+            raise CommandError(f"{table} is already partitioned.")
+
+        statements = _partition_sql(table, partitions, _referencing_constraints(table))
+        if options["dry_run"]:
+            for sql in statements:
+                self.stdout.write(sql + ";")
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f"{table} partitioned into {partitions} partitions by owner_id."))
+
+
+def _is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def _referencing_constraints(table):
+    """(table, constraint) pairs for foreign keys that point at the card table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def _partition_sql(table, partitions, referencing):
+    qn = connection.ops.quote_name
+    opts = Flashcard._meta
+    old = f"{table}_unpartitioned"
+    # The old identity sequence keeps the default name until the old table is dropped.
+    seq = f"{table}_partitioned_id_seq"
+    pk = opts.pk.column
+    owner = opts.get_field("owner").column
+    set_col = opts.get_field("set").column
+    set_table = opts.get_field("set").related_model._meta.db_table
+    user_table = opts.get_field("owner").related_model._meta.db_table
+
+    statements = [
+        f"ALTER TABLE {qn(ref_table)} DROP CONSTRAINT {qn(name)}"
+        for ref_table, name in referencing
+    ]
+    statements += [
+        f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}",
+        f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) PARTITION BY HASH ({qn(owner)})",
+        f"CREATE SEQUENCE {qn(seq)} OWNED BY {qn(table)}.{qn(pk)}",
+        f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} SET DEFAULT nextval('{seq}')",
+        # Unique keys on a partitioned table must include the partition key.
+        f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_id_owner_uniq')} UNIQUE ({qn(pk)}, {qn(owner)})",
+    ]
+    statements += [
+        f"CREATE TABLE {qn(f'{table}_p{i}')} PARTITION OF {qn(table)} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+    statements += [
+        f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}",
+        f"DROP TABLE {qn(old)}",
+    ]
+    # LIKE copies no indexes. Rebuild every index the model declares (foreign keys and
+    # Meta.indexes) under Django's names after the copy, so the schema matches migrations.
+    statements += _index_sql()
+    statements += [
+        f"SELECT setval('{seq}', COALESCE((SELECT MAX({qn(pk)}) FROM {qn(table)}), 0) + 1, false)",
+        f"ALTER TABLE {qn(table)} ADD FOREIGN KEY ({qn(set_col)}) REFERENCES {qn(set_table)} (id) "
+        "DEFERRABLE INITIALLY DEFERRED",
+        f"ALTER TABLE {qn(table)} ADD FOREIGN KEY ({qn(owner)}) REFERENCES {qn(user_table)} (id) "
+        "DEFERRABLE INITIALLY DEFERRED",
+    ]
+    return statements
+
+
+def _index_sql():
+    with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+        return [str(sql) for sql in editor._model_indexes_sql(Flashcard)]
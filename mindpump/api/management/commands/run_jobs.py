@@ -0,0 +1,35 @@
+"""
+Work off jobs queued with DatabaseBackend (local stand-in for the SQS worker):
+
+    python manage.py run_jobs          # poll forever
+    python manage.py run_jobs --once   # drain the queue and exit
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from mindpump.api.jobs import run_job, stale_before
+from mindpump.api.repositories import JobRepository
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument("--batch-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        while True:
+            job_ids = JobRepository.next_queued_ids(
+                options["batch_size"], stale_before=stale_before()
+            )
+            for job_id in job_ids:
+                job = run_job(job_id)
+                if job is not None:
+                    self.stdout.write(f"{job}")
+            if not job_ids:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,98 @@
+"""
+Object storage for card media and set exports. For media the API only hands out
+presigned URLs; clients PUT and GET the bytes directly against S3 (or an S3-compatible stand-in such as MinIO
+or moto, via MEDIA_S3_ENDPOINT_URL).
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .repositories import CardMediaRepository
+
+# S3 DeleteObjects accepts at most this many keys per call.
+DELETE_BATCH_SIZE = 1000
+
+
+def get_media_storage():
+    return import_string(settings.MEDIA_STORAGE)()
+
+
+def copy_clone_media(source_set, clone_set, user):
+    """
+    Give a cloned set its own copy of the source's attachments: rows are created pending,
+    the objects copied server-side, then the rows marked ready. If copying fails midway,
+    cleanup_media removes the leftovers. Returns the number of attachments copied.
+    """
+    pairs = CardMediaRepository.copy_to_clone(source_set, clone_set, user)
+    if pairs:
+        storage = get_media_storage()
+        for media, source_key in pairs:
+            storage.copy(source_key, media.key)
+        CardMediaRepository.mark_ready_many([media for media, _ in pairs])
+    return len(pairs)
+
+
+class S3MediaStorage:
+    def __init__(self):
+        import boto3
+
+        self.client = boto3.client("s3", endpoint_url=settings.MEDIA_S3_ENDPOINT_URL or None)
+        self.bucket = settings.MEDIA_BUCKET
+
+    def upload_url(self, key, *, content_type, size):
+        """Presigned PUT; S3 rejects uploads whose Content-Type or length differ."""
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+            },
+            ExpiresIn=settings.MEDIA_URL_EXPIRES,
+        )
+
+    def download_url(self, key):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.MEDIA_URL_EXPIRES,
+        )
+
+    def put(self, key, fileobj, *, content_type):
+        """Upload a file object (multipart for large files) from the server side."""
+        self.client.upload_fileobj(
+            fileobj, self.bucket, key, ExtraArgs={"ContentType": content_type}
+        )
+
+    def copy(self, source_key, key):
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key}
+        )
+
+    def size(self, key):
+        """Size in bytes of an uploaded object, or None if it does not exist."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[start:start + DELETE_BATCH_SIZE]],
+                    "Quiet": True,
+                },
+            )
+
+    def iter_keys(self, prefix):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_add_user_to_flashcard_set"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcardset",
+            name="is_shared",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="CardProgress",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("interval_days", models.PositiveIntegerField(default=0)),
+                ("ease_factor", models.FloatField(default=2.5)),
+                ("due_at", models.DateTimeField(blank=True, null=True)),
+                ("lapses", models.PositiveIntegerField(default=0)),
+                ("reps", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "card",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress",
+                        to="api.flashcard",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="card_progress",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "card"), name="unique_card_progress_per_user"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+from django.db.models import F, Q
+
+STUDY_FIELDS = ["interval_days", "ease_factor", "due_at", "lapses", "reps"]
+BATCH_SIZE = 1000
+
+
+def _studied():
+    """Cards whose study fields differ from the defaults."""
+    return (
+        Q(reps__gt=0)
+        | Q(lapses__gt=0)
+        | Q(interval_days__gt=0)
+        | Q(due_at__isnull=False)
+        | ~Q(ease_factor=2.5)
+    )
+
+
+def copy_to_progress(apps, schema_editor):
+    """
+    Create a CardProgress row for the set owner of every card that has been studied.
+    Cards still at default study values need no row (progress is created lazily).
+    Progress needs a user, so studied cards in ownerless sets stop the migration
+    rather than having their study state dropped by 0005.
+    """
+    Flashcard = apps.get_model("api", "Flashcard")
+    CardProgress = apps.get_model("api", "CardProgress")
+    ownerless = Flashcard.objects.filter(_studied(), set__user__isnull=True).count()
+    if ownerless:
+        raise RuntimeError(
+            f"{ownerless} studied card(s) belong to sets without a user, and their study "
+            "state cannot be moved to CardProgress. Assign those sets a user, or reset the "
+            "cards' study fields to accept losing it, then migrate again."
+        )
+    studied = Flashcard.objects.filter(_studied()).values("id", "set__user_id", *STUDY_FIELDS)
+    batch = []
+    for row in studied.iterator(chunk_size=BATCH_SIZE):
+        batch.append(
+            CardProgress(
+                user_id=row["set__user_id"],
+                card_id=row["id"],
+                **{key: row[key] for key in STUDY_FIELDS},
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            CardProgress.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CardProgress.objects.bulk_create(batch)
+
+
+def copy_from_progress(apps, schema_editor):
+    """Reverse: write each set owner's progress back onto the card."""
+    Flashcard = apps.get_model("api", "Flashcard")
+    CardProgress = apps.get_model("api", "CardProgress")
+    owned = CardProgress.objects.filter(user_id=F("card__set__user_id")).values(
+        "card_id", *STUDY_FIELDS
+    )
+    batch = []
+    for row in owned.iterator(chunk_size=BATCH_SIZE):
+        batch.append(Flashcard(id=row["card_id"], **{key: row[key] for key in STUDY_FIELDS}))
+        if len(batch) >= BATCH_SIZE:
+            Flashcard.objects.bulk_update(batch, STUDY_FIELDS)
+            batch = []
+    if batch:
+        Flashcard.objects.bulk_update(batch, STUDY_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_cardprogress"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_progress, copy_from_progress),
+    ]
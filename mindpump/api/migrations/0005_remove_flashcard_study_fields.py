@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_copy_study_state_to_cardprogress"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="flashcard",
+            name="due_at",
+        ),
+        migrations.RemoveField(
+            model_name="flashcard",
+            name="ease_factor",
+        ),
+        migrations.RemoveField(
+            model_name="flashcard",
+            name="interval_days",
+        ),
+        migrations.RemoveField(
+            model_name="flashcard",
+            name="lapses",
+        ),
+        migrations.RemoveField(
+            model_name="flashcard",
+            name="reps",
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_owner(apps, schema_editor):
+    """Copy each card's set.user into the denormalized owner column."""
+    Flashcard = apps.get_model("api", "Flashcard")
+    FlashcardSet = apps.get_model("api", "FlashcardSet")
+    Flashcard.objects.update(
+        owner_id=Subquery(
+            FlashcardSet.objects.filter(pk=OuterRef("set_id")).values("user_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_remove_flashcard_study_fields"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcard",
+            name="owner",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(fields=["owner", "set"], name="flashcard_owner_set_idx"),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:00
+
+from django.conf import settings
+import hashlib
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+_whitespace = re.compile(r"\s+")
+
+
+# Frozen copy of models.card_content_hash, so this migration keeps its meaning.
+def _normalize(text):
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+def _content_hash(front, back):
+    normalized = _normalize(front) + "\x1f" + _normalize(back)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Flashcard = apps.get_model("api", "Flashcard")
+    batch = []
+    for card in Flashcard.objects.only("id", "front", "back").iterator(chunk_size=BATCH_SIZE):
+        card.content_hash = _content_hash(card.front, card.back)
+        batch.append(card)
+        if len(batch) >= BATCH_SIZE:
+            Flashcard.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    if batch:
+        Flashcard.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_cardmedia"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcard",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["set", "content_hash"], name="flashcard_set_hash_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_flashcard_content_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flashcardset",
+            index=models.Index(
+                condition=models.Q(("is_shared", True)),
+                fields=["-updated_at"],
+                name="flashcardset_shared_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_flashcardset_shared_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cardmedia",
+            index=models.Index(
+                fields=["card", "status"], name="cardmedia_card_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cardmedia",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["created_at"],
+                name="cardmedia_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status__in", ["queued", "running"])),
+                fields=["created_at"],
+                name="job_claimable_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_query_plan_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="flashcard",
+            name="flashcard_set_hash_idx",
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["owner", "set", "content_hash"],
+                name="flashcard_owner_set_hash_idx",
+            ),
+        ),
+    ]
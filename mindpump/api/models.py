@@ -1,6 +1,23 @@
+import hashlib
+import re
+import unicodedata
+
 from django.conf import settings
 from django.db import models
 
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_card_text(text):
+    """Case-, width- and whitespace-insensitive form of card text used for duplicate detection."""
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+def card_content_hash(front, back):
+    """sha256 hex digest of the normalized front/back (see Flashcard.content_hash)."""
+    normalized = normalize_card_text(front) + "\x1f" + normalize_card_text(back)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
 
 class FlashcardSet(models.Model):
     user = models.ForeignKey(
@@ -11,11 +28,21 @@ class FlashcardSet(models.Model):
     )
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
+    # Shared sets are readable and studyable by every user; only the owner can edit them.
+    is_shared = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            # The shared catalogue (GET /api/sets/?shared=true), newest first.
+            models.Index(
+                fields=["-updated_at"],
+                condition=models.Q(is_shared=True),
+                name="flashcardset_shared_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,20 +54,179 @@ class Flashcard(models.Model):
         on_delete=models.CASCADE,
         related_name="cards",
     )
+    # Denormalized set.user: the partition key for the (optionally hash-partitioned)
+    # card table. Repository queries filter on it so Postgres can prune partitions.
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
     front = models.TextField()
     back = models.TextField()
+    # card_content_hash(front, back); set by the repository write paths. Lets imports
+    # find duplicates with one indexed lookup instead of comparing text.
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # Spaced repetition (study status)
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["owner", "set"], name="flashcard_owner_set_idx"),
+            # Duplicate lookups (create_many): the owner leads, as in every card query.
+            models.Index(fields=["owner", "set", "content_hash"], name="flashcard_owner_set_hash_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.front[:50]}..." if len(self.front) > 50 else self.front
+
+    @property
+    def study(self):
+        """
+        The requesting user's CardProgress, as prefetched into `user_progress` by the
+        repositories. Unsaved defaults when the user has not reviewed the card yet.
+        """
+        progress = getattr(self, "user_progress", None)
+        if progress:
+            return progress[0]
+        return CardProgress(card=self)
+
+    @property
+    def media_refs(self):
+        """Uploaded media, as prefetched into `ready_media` by the repositories (else queried)."""
+        if not hasattr(self, "ready_media"):
+            self.ready_media = list(self.media.filter(status=CardMedia.STATUS_READY))
+        return self.ready_media
+
+
+class CardProgress(models.Model):
+    """
+    Per-user spaced repetition state for one card. Card content is shared;
+    rows are created lazily on a user's first review of the card.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="card_progress",
+    )
+    card = models.ForeignKey(
+        Flashcard,
+        on_delete=models.CASCADE,
+        related_name="progress",
+    )
     interval_days = models.PositiveIntegerField(default=0)
     ease_factor = models.FloatField(default=2.5)
     due_at = models.DateTimeField(null=True, blank=True)
     lapses = models.PositiveIntegerField(default=0)
     reps = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "card"], name="unique_card_progress_per_user"),
+        ]
 
     def __str__(self):
-        return f"{self.front[:50]}..." if len(self.front) > 50 else self.front
+        return f"{self.user_id}:{self.card_id}"
+
+
+class CardMedia(models.Model):
+    """
+    An image/audio attachment stored in S3 under `key`. Clients upload and download
+    through presigned URLs (see media_storage.py), so the bytes never pass through Lambda.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_READY = "ready"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending upload"),
+        (STATUS_READY, "Ready"),
+    ]
+
+    card = models.ForeignKey(
+        Flashcard,
+        on_delete=models.CASCADE,
+        related_name="media",
+        # No DB constraint so this also works on a partitioned card table (see
+        # partition_flashcards); the ORM still cascades deletes.
+        db_constraint=False,
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="card_media",
+        null=True,
+    )
+    key = models.CharField(max_length=255, unique=True)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            # Ready media of a page of cards (CardMediaRepository.prefetch_ready).
+            models.Index(fields=["card", "status"], name="cardmedia_card_status_idx"),
+            # Abandoned uploads (CardMediaRepository.list_stale_pending); pending rows are few.
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="pending"),
+                name="cardmedia_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class Job(models.Model):
+    """A long-running operation (import, clone, ...) run by a queue worker; see jobs.py."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+        null=True,
+    )
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    params = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Claimable jobs, oldest first (JobRepository.next_queued_ids); finished jobs,
+            # the bulk of the table, are left out.
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="job_claimable_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,20 @@
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render responses as MessagePack (Accept: application/msgpack)."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Same conversions as the JSON renderer (datetimes, decimals, lazy strings...).
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
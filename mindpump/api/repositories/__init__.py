@@ -1,5 +1,15 @@
 from .user_repository import UserRepository
 from .flashcard_set_repository import FlashcardSetRepository
 from .flashcard_repository import FlashcardRepository
+from .card_progress_repository import CardProgressRepository
+from .job_repository import JobRepository
+from .card_media_repository import CardMediaRepository
 
-__all__ = ["UserRepository", "FlashcardSetRepository", "FlashcardRepository"]
+__all__ = [
+    "UserRepository",
+    "FlashcardSetRepository",
+    "FlashcardRepository",
+    "CardProgressRepository",
+    "JobRepository",
+    "CardMediaRepository",
+]
@@ -0,0 +1,112 @@
+import uuid
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+
+from ..models import CardMedia
+from .flashcard_repository import FlashcardRepository
+
+
+class CardMediaRepository:
+    """Card media metadata, using Django ORM. Bytes live in object storage (media_storage.py)."""
+
+    @staticmethod
+    def prefetch_ready(lookup="media"):
+        """Prefetch uploaded media into card.ready_media (see Flashcard.media_refs)."""
+        return Prefetch(
+            lookup,
+            queryset=CardMedia.objects.filter(status=CardMedia.STATUS_READY),
+            to_attr="ready_media",
+        )
+
+    @staticmethod
+    def attach(cards):
+        """Load uploaded media for the given cards in one query. Returns the cards."""
+        cards = list(cards)
+        prefetch_related_objects(cards, CardMediaRepository.prefetch_ready())
+        return cards
+
+    @staticmethod
+    def create(card, user, *, content_type, size):
+        return CardMedia.objects.create(
+            card=card,
+            owner=user if getattr(user, "is_authenticated", False) else None,
+            key=_new_key(card.pk),
+            content_type=content_type,
+            size=size,
+        )
+
+    @staticmethod
+    def copy_to_clone(source_set, clone_set, user):
+        """
+        Pending copies of source_set's uploaded media on the matching cards of clone_set
+        (FlashcardSetRepository.clone inserts cards in source id order, so the n-th cards
+        match). Returns (copy, source key) pairs; the objects still have to be copied.
+        """
+        media = list(
+            CardMedia.objects.filter(
+                card_id__in=FlashcardRepository.cards_of(source_set).values("pk"),
+                status=CardMedia.STATUS_READY,
+            )
+        )
+        if not media:
+            return []
+        clone_of = dict(
+            zip(
+                FlashcardRepository.cards_of(source_set).order_by("id").values_list("pk", flat=True),
+                FlashcardRepository.cards_of(clone_set).order_by("id").values_list("pk", flat=True),
+            )
+        )
+        owner = user if getattr(user, "is_authenticated", False) else None
+        pairs = [
+            (
+                CardMedia(
+                    card_id=clone_of[m.card_id],
+                    owner=owner,
+                    key=_new_key(clone_of[m.card_id]),
+                    content_type=m.content_type,
+                    size=m.size,
+                ),
+                m.key,
+            )
+            for m in media
+            if m.card_id in clone_of
+        ]
+        CardMedia.objects.bulk_create([copy for copy, _ in pairs])
+        return pairs
+
+    @staticmethod
+    def get_by_id(pk):
+        try:
+            return CardMedia.objects.select_related("card__set").get(pk=pk)
+        except CardMedia.DoesNotExist:
+            return None
+
+    @staticmethod
+    def mark_ready(media, size):
+        media.status = CardMedia.STATUS_READY
+        media.size = size
+        media.save(update_fields=["status", "size"])
+        return media
+
+    @staticmethod
+    def mark_ready_many(media):
+        CardMedia.objects.filter(pk__in=[m.pk for m in media]).update(status=CardMedia.STATUS_READY)
+
+    @staticmethod
+    def delete(media):
+        media.delete()
+
+    @staticmethod
+    def list_stale_pending(before):
+        return CardMedia.objects.filter(status=CardMedia.STATUS_PENDING, created_at__lt=before).order_by(
+            "created_at"
+        )
+
+    @staticmethod
+    def existing_keys(keys):
+        return set(CardMedia.objects.filter(key__in=keys).values_list("key", flat=True))
+
+
+def _new_key(card_pk):
+    return f"{settings.MEDIA_KEY_PREFIX}{card_pk}/{uuid.uuid4().hex}"
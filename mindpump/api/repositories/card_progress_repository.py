@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from ..models import CardProgress
+from .flashcard_repository import FlashcardRepository
+
+STUDY_FIELDS = {"interval_days", "ease_factor", "due_at", "lapses", "reps"}
+
+
+class CardProgressRepository:
+    """
+    Per-user study status for cards, using Django ORM.
+    Rows are created lazily on first review; until then a card reports defaults.
+    """
+
+    @staticmethod
+    def prefetch_for(user, lookup="progress"):
+        """Prefetch the user's progress rows into card.user_progress (see Flashcard.study)."""
+        if getattr(user, "is_authenticated", False):
+            queryset = CardProgress.objects.filter(user=user)
+        else:
+            queryset = CardProgress.objects.none()
+        return Prefetch(lookup, queryset=queryset, to_attr="user_progress")
+
+    @staticmethod
+    def attach(cards, user):
+        """Load the user's progress for the given cards in one query. Returns the cards."""
+        cards = list(cards)
+        by_card = {}
+        if getattr(user, "is_authenticated", False) and cards:
+            by_card = {
+                p.card_id: p
+                for p in CardProgress.objects.filter(user=user, card__in=cards)
+            }
+        for card in cards:
+            progress = by_card.get(card.pk)
+            card.user_progress = [progress] if progress else []
+        return cards
+
+    @staticmethod
+    def update(card, user, data):
+        """
+        data: dict with optional interval_days, ease_factor, due_at, lapses, reps.
+        Creates the user's progress row on first review. Returns the card.
+        """
+        progress, _ = CardProgress.objects.get_or_create(user=user, card=card)
+        update_fields = ["updated_at"]
+        for key in STUDY_FIELDS:
+            if key in data:
+                setattr(progress, key, data[key])
+                update_fields.append(key)
+        progress.save(update_fields=update_fields)
+        card.user_progress = [progress]
+        return card
+
+    @staticmethod
+    def update_batch(flashcard_set, user, items):
+        """
+        items: list of dicts with 'id' and optional study fields.
+        Cards not in flashcard_set are skipped. Returns list of updated cards.
+        """
+        card_ids = [item.get("id") for item in items]
+        cards = {
+            c.pk: c
+            for c in FlashcardRepository.cards_of(flashcard_set).filter(pk__in=card_ids)
+        }
+        existing = {
+            p.card_id: p
+            for p in CardProgress.objects.filter(user=user, card_id__in=cards.keys())
+        }
+        now = timezone.now()
+        to_create = {}
+        updated = []
+        for item in items:
+            card = cards.get(item.get("id"))
+            if card is None:
+                continue
+            progress = existing.get(card.pk) or to_create.get(card.pk)
+            if progress is None:
+                progress = to_create[card.pk] = CardProgress(user=user, card=card)
+            for key in STUDY_FIELDS:
+                if key in item:
+                    setattr(progress, key, item[key])
+            progress.updated_at = now
+            card.user_progress = [progress]
+            updated.append(card)
+        with transaction.atomic():
+            if to_create:
+                CardProgress.objects.bulk_create(to_create.values())
+            if existing:
+                CardProgress.objects.bulk_update(
+                    existing.values(), [*STUDY_FIELDS, "updated_at"]
+                )
+        return updated
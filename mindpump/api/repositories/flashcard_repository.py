@@ -1,24 +1,42 @@
+from django.db import transaction
 from django.db.models import QuerySet
+from django.utils import timezone
 
-from ..models import Flashcard
+from ..models import Flashcard, FlashcardSet, card_content_hash
 
-STUDY_FIELDS = {"interval_days", "ease_factor", "due_at", "lapses", "reps"}
+ON_DUPLICATE_ALLOW = "allow"
+ON_DUPLICATE_SKIP = "skip"
+ON_DUPLICATE_UPDATE = "update"
+ON_DUPLICATE_CHOICES = [ON_DUPLICATE_ALLOW, ON_DUPLICATE_SKIP, ON_DUPLICATE_UPDATE]
+
+# Incoming cards per duplicate lookup (one indexed query on (owner, set, content_hash) each).
+DUPLICATE_LOOKUP_CHUNK_SIZE = 500
 
 
 class FlashcardRepository:
     """
-    Flashcard (card) CRUD and study-status updates, using Django ORM.
-    Study status lives on the card model.
+    Flashcard (card) CRUD, using Django ORM.
+    Study status lives on CardProgress (see CardProgressRepository).
+    Card queries include the owner (partition key) alongside the set.
     """
 
+    @staticmethod
+    def cards_of(flashcard_set) -> QuerySet:
+        """The set's cards, filtered on the partition key as well as set_id."""
+        return Flashcard.objects.filter(set=flashcard_set, owner_id=flashcard_set.user_id)
+
     @staticmethod
     def list_by_set(flashcard_set) -> QuerySet:
-        return flashcard_set.cards.all().order_by("id")
+        return FlashcardRepository.cards_of(flashcard_set).order_by("id")
 
     @staticmethod
-    def get_by_id(pk):
+    def get_by_id(pk, owner=None):
+        """owner: restrict to cards owned by this user, so only one partition is searched."""
+        queryset = Flashcard.objects.select_related("set")
+        if owner is not None:
+            queryset = queryset.filter(owner=owner)
         try:
-            return Flashcard.objects.select_related("set").get(pk=pk)
+            return queryset.get(pk=pk)
         except Flashcard.DoesNotExist:
             return None
 
@@ -26,22 +44,56 @@ class FlashcardRepository:
     def create(flashcard_set, *, front, back):
         return Flashcard.objects.create(
             set=flashcard_set,
+            owner_id=flashcard_set.user_id,
             front=front,
             back=back,
+            content_hash=card_content_hash(front, back),
         )
 
     @staticmethod
-    def create_many(flashcard_set, items):
-        """items: list of dicts with 'front' and 'back'. Returns list of created cards."""
-        created = []
-        for item in items:
-            card = Flashcard.objects.create(
-                set=flashcard_set,
-                front=item["front"],
-                back=item["back"],
-            )
-            created.append(card)
-        return created
+    def create_many(flashcard_set, items, *, on_duplicate=ON_DUPLICATE_ALLOW):
+        """
+        items: list of dicts with 'front' and 'back'.
+        on_duplicate decides what happens to an item whose normalized content matches a
+        card already in the set (or an earlier item): "allow" creates it anyway, "skip"
+        drops it, "update" overwrites the existing card's text with the item's.
+        Returns list of created (and updated) cards.
+        """
+        result = []
+        updated_ids = set()
+        for start in range(0, len(items), DUPLICATE_LOOKUP_CHUNK_SIZE):
+            chunk = items[start:start + DUPLICATE_LOOKUP_CHUNK_SIZE]
+            hashes = [card_content_hash(item["front"], item["back"]) for item in chunk]
+            existing = {}
+            if on_duplicate != ON_DUPLICATE_ALLOW:
+                # No ORDER BY, so only the matching flashcard_owner_set_hash_idx entries are
+                # read; sorted here so the oldest card wins if the set holds duplicates.
+                matches = FlashcardRepository.cards_of(flashcard_set).filter(content_hash__in=hashes).order_by()
+                for card in sorted(matches, key=lambda card: card.pk):
+                    existing.setdefault(card.content_hash, card)
+            for item, content_hash in zip(chunk, hashes):
+                card = existing.get(content_hash)
+                if card is None or on_duplicate == ON_DUPLICATE_ALLOW:
+                    card = Flashcard.objects.create(
+                        set=flashcard_set,
+                        owner_id=flashcard_set.user_id,
+                        front=item["front"],
+                        back=item["back"],
+                        content_hash=content_hash,
+                    )
+                    existing[content_hash] = card
+                    # A later matching item in this request updates it without listing it twice.
+                    updated_ids.add(card.pk)
+                    result.append(card)
+                elif on_duplicate == ON_DUPLICATE_UPDATE:
+                    if (card.front, card.back) != (item["front"], item["back"]):
+                        card.front = item["front"]
+                        card.back = item["back"]
+                        card.save(update_fields=["front", "back", "updated_at"])
+                    if card.pk not in updated_ids:
+                        updated_ids.add(card.pk)
+                        result.append(card)
+        return result
 
     @staticmethod
     def update(card, *, front=None, back=None):
@@ -49,7 +101,8 @@ class FlashcardRepository:
             card.front = front
         if back is not None:
             card.back = back
-        card.save(update_fields=["front", "back", "updated_at"])
+        card.content_hash = card_content_hash(card.front, card.back)
+        card.save(update_fields=["front", "back", "content_hash", "updated_at"])
         return card
 
     @staticmethod
@@ -62,13 +115,14 @@ class FlashcardRepository:
         for item in items:
             card_id = item.get("id")
             try:
-                card = flashcard_set.cards.get(pk=card_id)
+                card = FlashcardRepository.cards_of(flashcard_set).get(pk=card_id)
             except Flashcard.DoesNotExist:
                 continue
             if "front" in item:
                 card.front = item["front"]
             if "back" in item:
                 card.back = item["back"]
+            card.content_hash = card_content_hash(card.front, card.back)
             card.save()
             updated.append(card)
         return updated
@@ -76,39 +130,23 @@ class FlashcardRepository:
     @staticmethod
     def delete_many(flashcard_set, card_ids):
         """Returns count of deleted cards."""
-        deleted, _ = flashcard_set.cards.filter(pk__in=card_ids).delete()
+        deleted, _ = FlashcardRepository.cards_of(flashcard_set).filter(pk__in=card_ids).delete()
         return deleted
 
     @staticmethod
-    def update_study(card, data):
-        """
-        data: dict with optional interval_days, ease_factor, due_at, lapses, reps.
-        Updates only provided keys. Returns the card.
+    def move_many(source_set, target_set, card_ids):
         """
-        update_fields = ["updated_at"]
-        for key in STUDY_FIELDS:
-            if key in data:
-                setattr(card, key, data[key])
-                update_fields.append(key)
-        card.save(update_fields=update_fields)
-        return card
-
-    @staticmethod
-    def update_study_batch(flashcard_set, items):
+        Move cards from source_set to target_set with one UPDATE; only cards that
+        belong to source_set are moved. Refreshes updated_at on both sets.
+        Returns count of moved cards.
         """
-        items: list of dicts with 'id' and optional study fields.
-        Returns list of updated cards.
-        """
-        updated = []
-        for item in items:
-            card_id = item.get("id")
-            try:
-                card = flashcard_set.cards.get(pk=card_id)
-            except Flashcard.DoesNotExist:
-                continue
-            for key in STUDY_FIELDS:
-                if key in item:
-                    setattr(card, key, item[key])
-            card.save()
-            updated.append(card)
-        return updated
+        now = timezone.now()
+        with transaction.atomic():
+            moved = FlashcardRepository.cards_of(source_set).filter(pk__in=card_ids).update(
+                set=target_set, owner_id=target_set.user_id, updated_at=now
+            )
+            if moved:
+                FlashcardSet.objects.filter(pk__in=[source_set.pk, target_set.pk]).update(
+                    updated_at=now
+                )
+        return moved
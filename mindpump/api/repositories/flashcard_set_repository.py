@@ -1,6 +1,14 @@
-from django.db.models import QuerySet
+from django.db import connection, transaction
+from django.db.models import Count, Prefetch, Q, QuerySet, prefetch_related_objects
+from django.utils import timezone
 
-from ..models import FlashcardSet
+from ..models import CardProgress, Flashcard, FlashcardSet
+from .card_media_repository import CardMediaRepository
+from .card_progress_repository import CardProgressRepository, STUDY_FIELDS
+from .flashcard_repository import FlashcardRepository
+
+# Flashcard columns copied verbatim by clone().
+CLONE_CONTENT_FIELDS = ["front", "back", "content_hash"]
 
 
 class FlashcardSetRepository:
@@ -9,20 +17,50 @@ class FlashcardSetRepository:
     @staticmethod
     def list_by_user(user) -> QuerySet:
         if getattr(user, "is_authenticated", False):
-            return FlashcardSet.objects.filter(user=user).prefetch_related("cards").order_by("-updated_at")
-        return FlashcardSet.objects.filter(user__isnull=True).prefetch_related("cards").order_by("-updated_at")
+            cards = Prefetch("cards", queryset=Flashcard.objects.filter(owner=user))
+            return FlashcardSet.objects.filter(user=user).prefetch_related(cards).order_by("-updated_at")
+        cards = Prefetch("cards", queryset=Flashcard.objects.filter(owner__isnull=True))
+        return FlashcardSet.objects.filter(user__isnull=True).prefetch_related(cards).order_by("-updated_at")
+
+    @staticmethod
+    def list_shared() -> QuerySet:
+        """Shared sets, newest first, with card counts annotated as _card_count (no cards loaded)."""
+        return (
+            FlashcardSet.objects.filter(is_shared=True)
+            .annotate(_card_count=Count("cards"))
+            .order_by("-updated_at")
+        )
 
     @staticmethod
-    def get_by_id_and_user(pk, user):
+    def get_by_id_and_user(pk, user, *, include_shared=False, prefetch_cards=True):
+        """
+        The user's set (or an ownerless set for anonymous users). include_shared also
+        matches other users' shared sets, for read-only access. Cards come with the
+        user's study progress prefetched unless prefetch_cards is False.
+        """
         if getattr(user, "is_authenticated", False):
-            try:
-                return FlashcardSet.objects.prefetch_related("cards").get(pk=pk, user=user)
-            except FlashcardSet.DoesNotExist:
-                return None
+            scope = Q(user=user)
+        else:
+            scope = Q(user__isnull=True)
+        if include_shared:
+            scope |= Q(is_shared=True)
         try:
-            return FlashcardSet.objects.prefetch_related("cards").get(pk=pk, user__isnull=True)
+            flashcard_set = FlashcardSet.objects.get(scope, pk=pk)
         except FlashcardSet.DoesNotExist:
             return None
+        if prefetch_cards:
+            # Fetched after the set so the cards are filtered on its owner (partition key),
+            # for shared sets too.
+            cards = (
+                FlashcardRepository.cards_of(flashcard_set)
+                .order_by("id")
+                .prefetch_related(
+                    CardProgressRepository.prefetch_for(user),
+                    CardMediaRepository.prefetch_ready(),
+                )
+            )
+            prefetch_related_objects([flashcard_set], Prefetch("cards", queryset=cards))
+        return flashcard_set
 
     @staticmethod
     def create(user, *, name, description=""):
@@ -33,14 +71,116 @@ class FlashcardSetRepository:
         )
 
     @staticmethod
-    def update(flashcard_set, *, name=None, description=None):
+    def update(flashcard_set, *, name=None, description=None, is_shared=None):
         if name is not None:
             flashcard_set.name = name
         if description is not None:
             flashcard_set.description = description
-        flashcard_set.save(update_fields=["name", "description", "updated_at"])
+        if is_shared is not None:
+            flashcard_set.is_shared = is_shared
+        flashcard_set.save(update_fields=["name", "description", "is_shared", "updated_at"])
         return flashcard_set
 
     @staticmethod
     def delete(flashcard_set):
         flashcard_set.delete()
+
+    @staticmethod
+    def clone(flashcard_set, user, *, name=None, reset_study=False):
+        """
+        Copy a set and all of its cards server-side with a single INSERT ... SELECT.
+        Unless reset_study, the user's progress on the source cards is copied to the
+        new cards as well. Media objects live in S3 and are copied separately
+        (media_storage.copy_clone_media). Returns the new set.
+        """
+        authenticated = getattr(user, "is_authenticated", False)
+        with transaction.atomic():
+            new_set = FlashcardSet.objects.create(
+                user=user if authenticated else None,
+                name=name or flashcard_set.name,
+                description=flashcard_set.description,
+            )
+            _copy_cards(flashcard_set, new_set)
+            if authenticated and not reset_study:
+                _copy_progress(flashcard_set, new_set, user.pk)
+        return new_set
+
+
+def _cards_where(flashcard_set):
+    """WHERE clause (and params) selecting a set's cards by set_id and partition key."""
+    opts = Flashcard._meta
+    qn = connection.ops.quote_name
+    set_col = qn(opts.get_field("set").column)
+    owner_col = qn(opts.get_field("owner").column)
+    if flashcard_set.user_id is None:
+        return f"{set_col} = %s AND {owner_col} IS NULL", [flashcard_set.pk]
+    return f"{set_col} = %s AND {owner_col} = %s", [flashcard_set.pk, flashcard_set.user_id]
+
+
+def _copy_cards(source_set, target_set):
+    """INSERT ... SELECT every card of source_set into target_set, keeping id order."""
+    opts = Flashcard._meta
+    qn = connection.ops.quote_name
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    columns = [opts.get_field("set").column, opts.get_field("owner").column]
+    select = ["%s", "%s"]
+    params = [target_set.pk, target_set.user_id]
+    for name in CLONE_CONTENT_FIELDS:
+        columns.append(opts.get_field(name).column)
+        select.append(qn(opts.get_field(name).column))
+    for name in ("created_at", "updated_at"):
+        columns.append(opts.get_field(name).column)
+        select.append("%s")
+        params.append(now)
+    where, where_params = _cards_where(source_set)
+    params.extend(where_params)
+
+    sql = "INSERT INTO {table} ({columns}) SELECT {select} FROM {table} WHERE {where} ORDER BY {pk}".format(
+        table=qn(opts.db_table),
+        columns=", ".join(qn(c) for c in columns),
+        select=", ".join(select),
+        where=where,
+        pk=qn(opts.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _copy_progress(source_set, target_set, user_id):
+    """
+    INSERT ... SELECT the user's progress from source cards onto their copies.
+    _copy_cards inserts in id order, so the n-th source card maps to the n-th copy.
+    """
+    card_opts = Flashcard._meta
+    opts = CardProgress._meta
+    qn = connection.ops.quote_name
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    study_columns = [opts.get_field(name).column for name in sorted(STUDY_FIELDS)]
+    ranked = "SELECT {pk} AS card_id, ROW_NUMBER() OVER (ORDER BY {pk}) AS rn FROM {table} WHERE ".format(
+        pk=qn(card_opts.pk.column),
+        table=qn(card_opts.db_table),
+    )
+    src_where, src_params = _cards_where(source_set)
+    dst_where, dst_params = _cards_where(target_set)
+
+    sql = (
+        "INSERT INTO {table} ({user_col}, {card_col}, {updated_col}, {columns}) "
+        "SELECT %s, dst.card_id, %s, {select} "
+        "FROM ({src}) src JOIN ({dst}) dst ON src.rn = dst.rn "
+        "JOIN {table} p ON p.{card_col} = src.card_id AND p.{user_col} = %s"
+    ).format(
+        table=qn(opts.db_table),
+        user_col=qn(opts.get_field("user").column),
+        card_col=qn(opts.get_field("card").column),
+        updated_col=qn(opts.get_field("updated_at").column),
+        columns=", ".join(qn(c) for c in study_columns),
+        select=", ".join("p." + qn(c) for c in study_columns),
+        src=ranked + src_where,
+        dst=ranked + dst_where,
+    )
+    params = [user_id, now, *src_params, *dst_params, user_id]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
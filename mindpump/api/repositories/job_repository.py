@@ -0,0 +1,83 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Job
+
+
+class JobRepository:
+    """Background job bookkeeping scoped by user, using Django ORM."""
+
+    @staticmethod
+    def create(user, kind, params, *, total=0):
+        return Job.objects.create(
+            user=user if getattr(user, "is_authenticated", False) else None,
+            kind=kind,
+            params=params,
+            total=total,
+        )
+
+    @staticmethod
+    def get_by_id(pk):
+        try:
+            return Job.objects.select_related("user").get(pk=pk)
+        except Job.DoesNotExist:
+            return None
+
+    @staticmethod
+    def get_by_id_and_user(pk, user):
+        if getattr(user, "is_authenticated", False):
+            scope = {"user": user}
+        else:
+            scope = {"user__isnull": True}
+        try:
+            return Job.objects.get(pk=pk, **scope)
+        except Job.DoesNotExist:
+            return None
+
+    @staticmethod
+    def claim(pk, *, stale_before=None):
+        """
+        Move a queued job to running. Returns False if another worker already has it.
+        A running job last updated before stale_before is taken to be abandoned (e.g. its
+        Lambda timed out) and is claimed again.
+        """
+        now = timezone.now()
+        return bool(
+            Job.objects.filter(_claimable(stale_before), pk=pk).update(
+                status=Job.STATUS_RUNNING, started_at=now, updated_at=now
+            )
+        )
+
+    @staticmethod
+    def next_queued_ids(limit, *, stale_before=None):
+        """Oldest queued jobs, plus running jobs abandoned before stale_before."""
+        return list(
+            Job.objects.filter(_claimable(stale_before))
+            .order_by("created_at")
+            .values_list("pk", flat=True)[:limit]
+        )
+
+    @staticmethod
+    def set_progress(job, progress):
+        job.progress = progress
+        Job.objects.filter(pk=job.pk).update(progress=progress, updated_at=timezone.now())
+
+    @staticmethod
+    def finish(job, *, result=None, error=""):
+        job.status = Job.STATUS_FAILED if error else Job.STATUS_SUCCEEDED
+        job.result = result
+        job.error = error
+        job.finished_at = timezone.now()
+        if not error:
+            job.progress = job.total
+        job.save(update_fields=["status", "result", "error", "finished_at", "progress", "updated_at"])
+        return job
+
+
+def _claimable(stale_before):
+    """Queued jobs, or running ones not updated since stale_before."""
+    claimable = Q(status=Job.STATUS_QUEUED)
+    if stale_before is not None:
+        claimable |= Q(updated_at__lt=stale_before)
+    # Always repeat job_claimable_idx's condition so the planner can match the index.
+    return Q(status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING]) & claimable
@@ -1,24 +1,46 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
-from .models import FlashcardSet, Flashcard
+from .models import FlashcardSet, Flashcard, CardProgress, CardMedia, Job
+from .repositories.flashcard_repository import ON_DUPLICATE_ALLOW, ON_DUPLICATE_CHOICES
 
 
 class FlashcardStudyStatusSerializer(serializers.ModelSerializer):
     """Read/write spaced-repetition fields only."""
 
     class Meta:
-        model = Flashcard
+        model = CardProgress
         fields = [
             "id",
+            "card",
             "interval_days",
             "ease_factor",
             "due_at",
             "lapses",
             "reps",
         ]
-        read_only_fields = ["id"]
+        read_only_fields = ["id", "card"]
+
+
+class CardMediaRefSerializer(serializers.ModelSerializer):
+    """Lightweight media reference embedded in cards; fetch a URL via GET /api/media/:id/."""
+
+    class Meta:
+        model = CardMedia
+        fields = ["id", "content_type", "size"]
 
 
 class FlashcardSerializer(serializers.ModelSerializer):
+    # Study fields come from the requesting user's CardProgress (Flashcard.study).
+    interval_days = serializers.IntegerField(source="study.interval_days", read_only=True)
+    ease_factor = serializers.FloatField(source="study.ease_factor", read_only=True)
+    due_at = serializers.DateTimeField(source="study.due_at", read_only=True)
+    lapses = serializers.IntegerField(source="study.lapses", read_only=True)
+    reps = serializers.IntegerField(source="study.reps", read_only=True)
+    media = CardMediaRefSerializer(source="media_refs", many=True, read_only=True)
+
     class Meta:
         model = Flashcard
         fields = [
@@ -30,12 +52,38 @@ class FlashcardSerializer(serializers.ModelSerializer):
             "due_at",
             "lapses",
             "reps",
+            "media",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
+STUDY_COLUMNS = ["interval_days", "ease_factor", "due_at", "lapses", "reps"]
+
+
+def card_columns(cards, *, content=False):
+    """
+    Columnar encoding of cards' study state (the requesting user's, via Flashcard.study):
+    parallel arrays keyed by field, datetimes as epoch seconds. content adds front/back.
+    """
+    columns = {"id": [card.pk for card in cards]}
+    if content:
+        columns["front"] = [card.front for card in cards]
+        columns["back"] = [card.back for card in cards]
+    studies = [card.study for card in cards]
+    for key in STUDY_COLUMNS:
+        columns[key] = [getattr(study, key) for study in studies]
+    columns["due_at"] = [_epoch(value) for value in columns["due_at"]]
+    return columns
+
+
+def _epoch(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return None if value is None else int(value.timestamp())
+
+
 class FlashcardMinimalSerializer(serializers.ModelSerializer):
     """For create batch: only front/back."""
 
@@ -54,6 +102,7 @@ class FlashcardSetSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "description",
+            "is_shared",
             "card_count",
             "cards",
             "created_at",
@@ -81,13 +130,15 @@ class FlashcardSetListSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "description",
+            "is_shared",
             "card_count",
             "created_at",
             "updated_at",
         ]
 
     def get_card_count(self, obj):
-        return obj.cards.count()
+        count = getattr(obj, "_card_count", None)
+        return obj.cards.count() if count is None else count
 
 
 # --- Batch / study request serializers ---
@@ -98,6 +149,11 @@ class CreateCardsBatchSerializer(serializers.Serializer):
         child=serializers.DictField(child=serializers.CharField()),
         help_text="List of { front, back }",
     )
+    on_duplicate = serializers.ChoiceField(
+        choices=ON_DUPLICATE_CHOICES,
+        default=ON_DUPLICATE_ALLOW,
+        help_text="Cards whose normalized front/back already exist in the set: allow, skip or update",
+    )
 
     def validate_cards(self, value):
         for i, item in enumerate(value):
@@ -138,16 +194,144 @@ class StudyStatusUpdateSerializer(serializers.Serializer):
     reps = serializers.IntegerField(min_value=0, required=False)
 
 
+class StudyColumnsSerializer(serializers.Serializer):
+    """
+    Columnar study payload: parallel arrays, one entry per card. due_at is epoch
+    seconds (or null). Optional columns must be as long as id when present.
+    """
+
+    id = serializers.ListField(child=serializers.IntegerField())
+    interval_days = serializers.ListField(child=serializers.IntegerField(min_value=0), required=False)
+    ease_factor = serializers.ListField(child=serializers.FloatField(min_value=1.3), required=False)
+    due_at = serializers.ListField(child=serializers.FloatField(allow_null=True), required=False)
+    lapses = serializers.ListField(child=serializers.IntegerField(min_value=0), required=False)
+    reps = serializers.ListField(child=serializers.IntegerField(min_value=0), required=False)
+
+    def validate_due_at(self, value):
+        due_at = []
+        for i, ts in enumerate(value):
+            if ts is None:
+                due_at.append(None)
+                continue
+            try:
+                due_at.append(datetime.fromtimestamp(ts, tz=timezone.utc))
+            except (OverflowError, ValueError, OSError):
+                raise serializers.ValidationError(f"Entry {i} is not a valid epoch timestamp")
+        return due_at
+
+    def validate(self, attrs):
+        for key, column in attrs.items():
+            if len(column) != len(attrs["id"]):
+                raise serializers.ValidationError(f"Column '{key}' must have {len(attrs['id'])} entries")
+        return attrs
+
+    @staticmethod
+    def to_rows(columns):
+        """Validated columns (due_at already datetimes) as a list of { id, study fields... } dicts."""
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
 class StudyStatusBatchSerializer(serializers.Serializer):
-    """Batch update study status. Each item: id + optional study fields."""
+    """
+    Batch update study status. Either cards (each item: id + optional study fields)
+    or columns (see StudyColumnsSerializer); validated_data always has "cards".
+    """
 
     cards = serializers.ListField(
         child=serializers.DictField(),
         help_text="List of { id, interval_days?, ease_factor?, due_at?, lapses?, reps? }",
+        required=False,
     )
+    columns = StudyColumnsSerializer(required=False)
 
     def validate_cards(self, value):
         for i, item in enumerate(value):
             if not isinstance(item, dict) or "id" not in item:
                 raise serializers.ValidationError(f"Item {i} must have 'id'")
         return value
+
+    def validate(self, attrs):
+        if ("cards" in attrs) == ("columns" in attrs):
+            raise serializers.ValidationError("Provide exactly one of 'cards' or 'columns'")
+        if "columns" in attrs:
+            attrs["cards"] = StudyColumnsSerializer.to_rows(attrs.pop("columns"))
+        return attrs
+
+
+class CloneSetSerializer(serializers.Serializer):
+    """Clone a set. name defaults to the source set's name."""
+
+    name = serializers.CharField(max_length=255, required=False)
+    reset_study = serializers.BooleanField(required=False, default=False)
+
+
+class MoveCardsSerializer(serializers.Serializer):
+    target_set_id = serializers.IntegerField()
+    card_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        help_text="List of card IDs to move",
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "total",
+            "result",
+            "error",
+            "created_at",
+            "updated_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class BatchSubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    path = serializers.CharField(help_text='API path, e.g. "/api/sets/1/" or "sets/1/?layout=columnar"')
+    body = serializers.JSONField(required=False, allow_null=True)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=BatchSubRequestSerializer(),
+        allow_empty=False,
+        help_text="List of { method, path, body? }",
+    )
+    atomic = serializers.BooleanField(required=False, default=False)
+
+    def validate_requests(self, value):
+        limit = settings.BATCH_MAX_REQUESTS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} requests per batch")
+        return value
+
+
+class CardMediaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CardMedia
+        fields = ["id", "card", "content_type", "size", "status", "created_at"]
+        read_only_fields = fields
+
+
+class CreateCardMediaSerializer(serializers.Serializer):
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_content_type(self, value):
+        if not any(value.startswith(prefix) for prefix in settings.MEDIA_ALLOWED_TYPES):
+            raise serializers.ValidationError(
+                f"Allowed types: {', '.join(t + '*' for t in settings.MEDIA_ALLOWED_TYPES)}"
+            )
+        return value
+
+    def validate_size(self, value):
+        if value > settings.MEDIA_MAX_BYTES:
+            raise serializers.ValidationError(f"At most {settings.MEDIA_MAX_BYTES} bytes")
+        return value
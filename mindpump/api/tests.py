@@ -0,0 +1,841 @@
+import io
+import json
+import os
+from datetime import timedelta
+from unittest import mock, skipIf
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from mindpump import db_routers
+from mindpump.api import jobs
+from mindpump.api.management.commands import check_query_plans
+from mindpump.api.media_storage import get_media_storage
+from mindpump.api.models import CardMedia, CardProgress, Flashcard, FlashcardSet, Job, card_content_hash
+from mindpump.api.repositories import (
+    CardProgressRepository,
+    FlashcardRepository,
+    FlashcardSetRepository,
+    JobRepository,
+)
+
+try:  # test-only dependencies, see requirements-test.txt
+    import boto3
+    import requests
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+User = get_user_model()
+
+
+def _touches_sets(queries):
+    return [q["sql"] for q in queries if '"api_flashcardset"' in q["sql"]]
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The "replica" alias is added for this class only: a second connection to the test
+    database. TransactionTestCase, so rows are committed and visible to both
+    connections; which one served a query is read from each connection's log.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test runner has set up (and setUpClass guarded) the configured
+        # aliases: the runner never sees it, this class may use it.
+        replica = {**connections["default"].settings_dict, "TEST": {"MIRROR": "default"}}
+        connections.settings[db_routers.REPLICA_DB_ALIAS] = replica
+        cls.databases = {*cls.databases, db_routers.REPLICA_DB_ALIAS}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[db_routers.REPLICA_DB_ALIAS].close()
+        del connections[db_routers.REPLICA_DB_ALIAS]
+        del connections.settings[db_routers.REPLICA_DB_ALIAS]
+        cls.databases = cls.databases - {db_routers.REPLICA_DB_ALIAS}
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create(username="reader")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _request(self, method, path, **kwargs):
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(
+            connections["replica"]
+        ) as replica:
+            response = getattr(self.client, method)(path, format="json", **kwargs)
+        return response, _touches_sets(primary), _touches_sets(replica)
+
+    def test_safe_requests_read_from_replica(self):
+        response, primary, replica = self._request("get", "/api/sets/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["name"] for s in response.json()], ["Deck"])
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+    def test_writes_go_to_primary_and_set_sticky_cookie(self):
+        response, primary, replica = self._request("post", "/api/sets/", data={"name": "New"})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(any(sql.startswith("INSERT") for sql in primary))
+        self.assertEqual(replica, [])
+        self.assertIn(db_routers.STICKY_COOKIE_NAME, response.cookies)
+
+    def test_failed_write_does_not_set_sticky_cookie(self):
+        response, _, _ = self._request("post", "/api/sets/", data={})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(db_routers.STICKY_COOKIE_NAME, response.cookies)
+
+    def test_sticky_cookie_reads_from_primary(self):
+        self._request("patch", f"/api/sets/{self.flashcard_set.pk}/", data={"name": "Renamed"})
+        response, primary, replica = self._request("get", "/api/sets/")
+        self.assertEqual([s["name"] for s in response.json()], ["Renamed"])
+        self.assertTrue(primary)
+        self.assertEqual(replica, [])
+
+    def test_tampered_sticky_cookie_is_ignored(self):
+        self.client.cookies[db_routers.STICKY_COOKIE_NAME] = "1"
+        _, primary, replica = self._request("get", "/api/sets/")
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+    def test_sticky_header_reads_from_primary(self):
+        _, primary, replica = self._request("get", "/api/sets/", HTTP_X_READ_PRIMARY="1")
+        self.assertTrue(primary)
+        self.assertEqual(replica, [])
+
+    def test_batch_reads_from_primary_after_a_write(self):
+        batch = {"requests": [{"method": "GET", "path": "/api/sets/"}]}
+        _, primary, replica = self._request("post", "/api/batch/", data=batch)
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+        batch["requests"].insert(
+            0, {"method": "PATCH", "path": f"/api/sets/{self.flashcard_set.pk}/", "body": {"name": "Renamed"}}
+        )
+        response, primary, replica = self._request("post", "/api/batch/", data=batch)
+        self.assertEqual([s["name"] for s in response.json()["responses"][1]["body"]], ["Renamed"])
+        self.assertEqual(replica, [])
+        self.assertIn(db_routers.STICKY_COOKIE_NAME, response.cookies)
+
+    def test_router_sends_writes_to_primary_inside_replica_block(self):
+        router = db_routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(FlashcardSet), "default")
+        with db_routers.read_from_replica():
+            self.assertEqual(router.db_for_read(FlashcardSet), "replica")
+            self.assertEqual(router.db_for_write(FlashcardSet), "default")
+        self.assertFalse(router.allow_migrate("replica", "api"))
+
+
+class SharedSetProgressTests(TestCase):
+    """Each user studies a shared set with their own CardProgress; only the owner edits it."""
+
+    def setUp(self):
+        self.owner = User.objects.create(username="author")
+        self.reader = User.objects.create(username="student")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.owner, name="Shared", is_shared=True)
+        self.card = FlashcardRepository.create(self.flashcard_set, front="f", back="b")
+        self.owner_client = APIClient()
+        self.owner_client.force_authenticate(self.owner)
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+
+    def _reps(self, client):
+        response = client.get(f"/api/sets/{self.flashcard_set.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["cards"][0]["reps"]
+
+    def test_progress_is_per_user(self):
+        self.owner_client.patch(f"/api/cards/{self.card.pk}/study/", {"reps": 3}, format="json")
+        response = self.reader_client.patch(
+            f"/api/sets/{self.flashcard_set.pk}/cards/study/batch/",
+            {"cards": [{"id": self.card.pk, "reps": 9}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self._reps(self.owner_client), self._reps(self.reader_client)), (3, 9))
+
+    def test_progress_rows_are_created_on_first_review(self):
+        self.assertEqual(self._reps(self.reader_client), 0)
+        self.assertFalse(CardProgress.objects.exists())
+        for reps in (1, 2):
+            self.reader_client.patch(f"/api/cards/{self.card.pk}/study/", {"reps": reps}, format="json")
+        self.assertEqual(
+            list(CardProgress.objects.values_list("user_id", "reps")), [(self.reader.pk, 2)]
+        )
+
+    def test_duplicate_ids_in_a_batch_update_one_row(self):
+        CardProgressRepository.update_batch(
+            self.flashcard_set, self.reader, [{"id": self.card.pk, "reps": 1}, {"id": self.card.pk, "lapses": 2}]
+        )
+        self.assertEqual(list(CardProgress.objects.values_list("reps", "lapses")), [(1, 2)])
+
+    def test_shared_set_is_read_only_for_others(self):
+        response = self.reader_client.patch(
+            f"/api/sets/{self.flashcard_set.pk}/cards/batch/",
+            {"cards": [{"id": self.card.pk, "front": "changed"}]},
+            format="json",
+        )
+        self.assertIn(response.status_code, (404, 405))
+        response = self.reader_client.patch(
+            f"/api/sets/{self.flashcard_set.pk}/", {"name": "Taken"}, format="json"
+        )
+        self.assertIn(response.status_code, (404, 405))
+        self.card.refresh_from_db()
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual((self.card.front, self.flashcard_set.name), ("f", "Shared"))
+
+
+class StudyStateMigrationTests(TransactionTestCase):
+    """0004 moves study state from cards to CardProgress, or stops if it cannot."""
+
+    before = [("api", "0003_cardprogress")]
+    after = [("api", "0004_copy_study_state_to_cardprogress")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+        self.user = self.apps.get_model(User._meta.app_label, User._meta.model_name).objects.create(
+            username="legacy"
+        )
+
+    def tearDown(self):
+        self.apps.get_model("api", "FlashcardSet").objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _card(self, user, **study):
+        flashcard_set = self.apps.get_model("api", "FlashcardSet").objects.create(user=user, name="Old")
+        return self.apps.get_model("api", "Flashcard").objects.create(set=flashcard_set, front="f", back="b", **study)
+
+    def test_copies_studied_cards_of_owned_sets(self):
+        studied = self._card(self.user, reps=5, interval_days=3)
+        self._card(self.user)
+        MigrationExecutor(connection).migrate(self.after)
+        apps = MigrationExecutor(connection).loader.project_state(self.after).apps
+        rows = apps.get_model("api", "CardProgress").objects.values_list("user_id", "card_id", "reps", "interval_days")
+        self.assertEqual(list(rows), [(self.user.pk, studied.pk, 5, 3)])
+
+    def test_refuses_to_drop_study_state_of_ownerless_sets(self):
+        self._card(None, reps=2)
+        with self.assertRaisesMessage(RuntimeError, "1 studied card(s) belong to sets without a user"):
+            MigrationExecutor(connection).migrate(self.after)
+
+
+class CloneAndMoveTests(TestCase):
+    """POST /api/sets/:id/clone/ and /api/sets/:id/cards/move/."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="mover")
+        self.source = FlashcardSet.objects.create(user=self.user, name="Source")
+        self.target = FlashcardSet.objects.create(user=self.user, name="Target")
+        self.cards = [FlashcardRepository.create(self.source, front=f"f{i}", back=f"b{i}") for i in range(3)]
+        # Progress on the middle card only: a row-mapping slip would move it.
+        CardProgressRepository.update(self.cards[1], self.user, {"reps": 4, "interval_days": 7})
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _clone(self, **body):
+        response = self.client.post(f"/api/sets/{self.source.pk}/clone/", body, format="json")
+        self.assertEqual(response.status_code, 201)
+        return FlashcardSet.objects.get(pk=response.json()["id"])
+
+    def _progress(self, flashcard_set):
+        cards = CardProgressRepository.attach(FlashcardRepository.list_by_set(flashcard_set), self.user)
+        return [(card.front, card.study.reps, card.study.interval_days) for card in cards]
+
+    def test_clone_copies_cards_and_progress(self):
+        clone = self._clone(name="Copy")
+        self.assertEqual(clone.name, "Copy")
+        self.assertEqual(self._progress(clone), self._progress(self.source))
+        self.assertEqual(self._progress(clone)[1], ("f1", 4, 7))
+
+    def test_clone_with_reset_study(self):
+        clone = self._clone(reset_study=True)
+        self.assertEqual([p[0] for p in self._progress(clone)], ["f0", "f1", "f2"])
+        self.assertFalse(
+            CardProgress.objects.filter(card__in=FlashcardRepository.cards_of(clone)).exists()
+        )
+
+    def _move(self, target_pk, card_ids):
+        return self.client.post(
+            f"/api/sets/{self.source.pk}/cards/move/",
+            {"target_set_id": target_pk, "card_ids": card_ids},
+            format="json",
+        )
+
+    def test_move(self):
+        other_set = FlashcardSet.objects.create(user=self.user, name="Elsewhere")
+        stray = FlashcardRepository.create(other_set, front="stray", back="b")
+        before = timezone.now()
+
+        response = self._move(self.target.pk, [self.cards[0].pk, stray.pk, 999999])
+        self.assertEqual(response.json(), {"moved": 1})
+        self.assertEqual([c.front for c in FlashcardRepository.list_by_set(self.target)], ["f0"])
+        self.assertEqual(FlashcardRepository.cards_of(other_set).get().pk, stray.pk)
+        for flashcard_set in (self.source, self.target):
+            flashcard_set.refresh_from_db()
+            self.assertGreaterEqual(flashcard_set.updated_at, before)
+
+    def test_move_to_another_users_set_is_404(self):
+        foreign = FlashcardSet.objects.create(user=User.objects.create(username="other"), name="Theirs")
+        response = self._move(foreign.pk, [self.cards[0].pk])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(FlashcardRepository.cards_of(self.source).count(), 3)
+
+
+class BatchTests(TestCase):
+    """POST /api/batch/."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="batcher")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _batch(self, *requests, atomic=False):
+        response = self.client.post("/api/batch/", {"requests": list(requests), "atomic": atomic}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_envelope(self):
+        data = self._batch(
+            {"method": "POST", "path": "/api/sets/", "body": {"name": "New"}},
+            {"method": "GET", "path": "sets/"},
+            {"method": "GET", "path": "/api/nowhere/"},
+        )
+        self.assertTrue(data["committed"])
+        self.assertEqual([r["status"] for r in data["responses"]], [201, 200, 404])
+        self.assertEqual(data["responses"][0]["body"]["name"], "New")
+        self.assertEqual({s["name"] for s in data["responses"][1]["body"]}, {"Deck", "New"})
+
+    def test_no_content_sub_request(self):
+        data = self._batch({"method": "DELETE", "path": f"/api/sets/{self.flashcard_set.pk}/"})
+        self.assertEqual(data["responses"], [{"status": 204, "body": None}])
+        self.assertFalse(FlashcardSet.objects.filter(pk=self.flashcard_set.pk).exists())
+
+    def test_atomic_rolls_back_at_first_error(self):
+        data = self._batch(
+            {"method": "POST", "path": "/api/sets/", "body": {"name": "Rolled back"}},
+            {"method": "POST", "path": "/api/sets/", "body": {}},
+            {"method": "DELETE", "path": f"/api/sets/{self.flashcard_set.pk}/"},
+            atomic=True,
+        )
+        self.assertFalse(data["committed"])
+        self.assertEqual([r["status"] for r in data["responses"]], [201, 400])
+        self.assertEqual(list(FlashcardSet.objects.values_list("name", flat=True)), ["Deck"])
+
+    def test_nested_batch_is_rejected(self):
+        data = self._batch({"method": "POST", "path": "/api/batch/", "body": {"requests": []}})
+        self.assertEqual(data["responses"][0]["status"], 400)
+
+    def test_unexpected_error_is_a_per_item_500(self):
+        with mock.patch.object(
+            FlashcardSetRepository, "list_by_user", side_effect=RuntimeError("boom")
+        ), self.assertLogs("mindpump.api.views", "ERROR"):
+            data = self._batch(
+                {"method": "POST", "path": "/api/sets/", "body": {"name": "Kept"}},
+                {"method": "GET", "path": "/api/sets/"},
+            )
+        self.assertEqual([r["status"] for r in data["responses"]], [201, 500])
+        self.assertTrue(FlashcardSet.objects.filter(name="Kept").exists())
+
+
+class MessagePackTests(TestCase):
+    """application/msgpack request bodies and responses, and ?layout=columnar."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="packer")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.card = FlashcardRepository.create(self.flashcard_set, front="f", back="b")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, body):
+        return self.client.post(
+            "/api/sets/", body, content_type="application/msgpack", HTTP_ACCEPT="application/msgpack"
+        )
+
+    def test_request_and_response(self):
+        response = self._post(msgpack.packb({"name": "Packed"}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data["name"], "Packed")
+        self.assertIsInstance(data["created_at"], str)
+
+    def test_invalid_bodies_are_400(self):
+        for body, detail in [
+            (b"\xc1", "FormatError"),
+            (msgpack.packb({"name": "x"}) + b"\x00", "extra data"),
+            (msgpack.packb({(1, 2): 1}), "unhashable"),
+        ]:
+            with self.subTest(detail=detail):
+                response = self._post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(detail, msgpack.unpackb(response.content)["detail"])
+
+    def test_columnar_set_detail(self):
+        due_at = timezone.now().replace(microsecond=0)
+        CardProgressRepository.update(self.card, self.user, {"reps": 2, "due_at": due_at})
+        response = self.client.get(f"/api/sets/{self.flashcard_set.pk}/?layout=columnar")
+        cards = response.json()["cards"]
+        self.assertEqual(cards["id"], [self.card.pk])
+        self.assertEqual((cards["front"], cards["back"], cards["reps"]), (["f"], ["b"], [2]))
+        self.assertEqual(cards["due_at"], [int(due_at.timestamp())])
+
+
+class DuplicateCardTests(TestCase):
+    """FlashcardRepository.create_many's on_duplicate and the content_hash it relies on."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="curator")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.card = FlashcardRepository.create(self.flashcard_set, front="Hello  World", back="Hallo")
+
+    def _cards(self):
+        return [(c.front, c.back) for c in FlashcardRepository.list_by_set(self.flashcard_set)]
+
+    def test_normalization(self):
+        self.assertEqual(card_content_hash("Hello  World", "Hallo"), card_content_hash(" hello world", "HALLO "))
+        self.assertEqual(card_content_hash("ﬁne", "x"), card_content_hash("fine", "x"))
+        self.assertNotEqual(card_content_hash("a b", "c"), card_content_hash("a", "b c"))
+
+    def test_allow(self):
+        created = FlashcardRepository.create_many(
+            self.flashcard_set, [{"front": "hello world", "back": "hallo"}], on_duplicate="allow"
+        )
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len(self._cards()), 2)
+
+    def test_skip(self):
+        created = FlashcardRepository.create_many(
+            self.flashcard_set,
+            [
+                {"front": "hello world", "back": "hallo"},
+                {"front": "New", "back": "Neu"},
+                {"front": "new", "back": "neu"},
+            ],
+            on_duplicate="skip",
+        )
+        self.assertEqual([(c.front, c.back) for c in created], [("New", "Neu")])
+        self.assertEqual(self._cards(), [("Hello  World", "Hallo"), ("New", "Neu")])
+
+    def test_update(self):
+        created = FlashcardRepository.create_many(
+            self.flashcard_set,
+            [{"front": "hello world", "back": "hallo"}, {"front": "HELLO WORLD", "back": "HALLO"}],
+            on_duplicate="update",
+        )
+        self.assertEqual([c.pk for c in created], [self.card.pk])
+        self.assertEqual(self._cards(), [("HELLO WORLD", "HALLO")])
+
+    def test_duplicates_only_match_within_the_set(self):
+        other = FlashcardSet.objects.create(user=self.user, name="Other")
+        created = FlashcardRepository.create_many(
+            other, [{"front": "Hello World", "back": "Hallo"}], on_duplicate="skip"
+        )
+        self.assertEqual(len(created), 1)
+
+    def test_writes_keep_the_hash(self):
+        FlashcardRepository.update(self.card, front="Changed")
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.content_hash, card_content_hash("Changed", "Hallo"))
+
+        FlashcardRepository.update_batch(self.flashcard_set, [{"id": self.card.pk, "back": "Anders"}])
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.content_hash, card_content_hash("Changed", "Anders"))
+
+        clone = FlashcardSetRepository.clone(self.flashcard_set, self.user)
+        self.assertEqual(
+            list(FlashcardRepository.cards_of(clone).values_list("content_hash", flat=True)),
+            [self.card.content_hash],
+        )
+
+
+@override_settings(
+    JOBS_BACKEND="mindpump.api.jobs.InlineBackend", JOBS_INLINE_MAX_CARDS=2, JOBS_CHUNK_SIZE=2
+)
+class JobTests(TestCase):
+    """Background jobs, run by InlineBackend when the request's transaction commits."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="importer")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cards = [{"front": f"front {i}", "back": "back"} for i in range(3)]
+
+    def _fronts(self, flashcard_set=None):
+        cards = FlashcardRepository.list_by_set(flashcard_set or self.flashcard_set)
+        return [card.front for card in cards]
+
+    def test_enqueue_waits_for_commit(self):
+        with override_settings(JOBS_BACKEND="mindpump.api.jobs.DatabaseBackend"):
+            job = jobs.enqueue(self.user, jobs.KIND_IMPORT_CARDS, {"set_id": 1}, total=3)
+        self.assertEqual((job.status, job.total, job.progress), (Job.STATUS_QUEUED, 3, 0))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            job = jobs.enqueue(
+                self.user, jobs.KIND_IMPORT_CARDS, {"set_id": self.flashcard_set.pk, "cards": self.cards}
+            )
+            self.assertEqual(self._fronts(), [])
+        self.assertEqual(len(callbacks), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, {"set_id": self.flashcard_set.pk, "written": 3})
+
+    def test_large_import_is_accepted_as_a_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/sets/{self.flashcard_set.pk}/cards/batch/", {"cards": self.cards}, format="json"
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Location"], f"/api/jobs/{response.json()['id']}/")
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.json()["status"], Job.STATUS_SUCCEEDED)
+        self.assertEqual(response.json()["progress"], 3)
+        self.assertEqual(self._fronts(), ["front 0", "front 1", "front 2"])
+
+    @override_settings(JOBS_BACKEND="")
+    def test_without_backend_large_requests_run_inline(self):
+        response = self.client.post(
+            f"/api/sets/{self.flashcard_set.pk}/cards/batch/", {"cards": self.cards}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 3)
+
+        response = self.client.post(f"/api/sets/{self.flashcard_set.pk}/clone/", {}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self._fronts(FlashcardSet.objects.get(pk=response.json()["id"]))), 3)
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_detail_is_scoped_to_its_user(self):
+        job = JobRepository.create(self.user, jobs.KIND_IMPORT_CARDS, {})
+        other = APIClient()
+        other.force_authenticate(User.objects.create(username="other"))
+        self.assertEqual(other.get(f"/api/jobs/{job.pk}/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/jobs/{job.pk}/").status_code, 200)
+
+    def test_claim_and_stale_reclaim(self):
+        job = JobRepository.create(self.user, jobs.KIND_IMPORT_CARDS, {})
+        self.assertTrue(JobRepository.claim(job.pk, stale_before=jobs.stale_before()))
+        self.assertFalse(JobRepository.claim(job.pk, stale_before=jobs.stale_before()))
+
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertFalse(JobRepository.claim(job.pk))
+        self.assertEqual(JobRepository.next_queued_ids(10, stale_before=jobs.stale_before()), [job.pk])
+        self.assertTrue(JobRepository.claim(job.pk, stale_before=jobs.stale_before()))
+
+    def test_sqs_event_reports_jobs_running_elsewhere(self):
+        queued = JobRepository.create(
+            self.user, jobs.KIND_IMPORT_CARDS, {"set_id": self.flashcard_set.pk, "cards": self.cards}
+        )
+        running = JobRepository.create(self.user, jobs.KIND_IMPORT_CARDS, {})
+        JobRepository.claim(running.pk)
+        done = JobRepository.create(self.user, jobs.KIND_IMPORT_CARDS, {})
+        JobRepository.finish(done, result={})
+        event = {
+            "Records": [
+                {"messageId": f"m{job.pk}", "eventSource": "aws:sqs", "body": json.dumps({"job_id": job.pk})}
+                for job in (queued, running, done)
+            ]
+        }
+        self.assertTrue(jobs.is_sqs_event(event))
+        with mock.patch("mindpump.api.jobs.close_old_connections"):
+            result = jobs.handle_sqs_event(event)
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": f"m{running.pk}"}]})
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.STATUS_SUCCEEDED)
+
+    def test_reclaimed_import_resumes_after_last_chunk(self):
+        job = JobRepository.create(
+            self.user, jobs.KIND_IMPORT_CARDS, {"set_id": self.flashcard_set.pk, "cards": self.cards}, total=3
+        )
+        FlashcardRepository.create_many(self.flashcard_set, self.cards[:2])
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_RUNNING, progress=2, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        job = jobs.run_job(job.pk)
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result["written"], 1)
+        self.assertEqual(self._fronts(), ["front 0", "front 1", "front 2"])
+
+
+@skipIf(mock_aws is None, "moto is not installed")
+@override_settings(MEDIA_BUCKET="test-media", MEDIA_S3_ENDPOINT_URL="")
+class CardMediaTests(TestCase):
+    """Media upload, download, clone and cleanup against moto's in-process S3."""
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"})
+        env.start()
+        self.addCleanup(env.stop)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client("s3")
+        self.s3.create_bucket(Bucket="test-media")
+
+        self.user = User.objects.create(username="owner")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.card = FlashcardRepository.create(self.flashcard_set, front="f", back="b")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, body=b"\x89PNG"):
+        response = self.client.post(
+            f"/api/cards/{self.card.pk}/media/",
+            {"content_type": "image/png", "size": len(body)},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        put = requests.put(data["upload_url"], data=body, headers=data["upload_headers"])
+        self.assertEqual(put.status_code, 200)
+        return data
+
+    def test_upload_complete_download(self):
+        data = self._upload()
+        self.assertEqual(data["status"], "pending")
+
+        response = self.client.post(f"/api/media/{data['id']}/complete/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ready")
+        self.assertEqual(response.json()["size"], 4)
+
+        response = self.client.get(f"/api/media/{data['id']}/")
+        self.assertEqual(requests.get(response.json()["url"]).content, b"\x89PNG")
+
+        response = self.client.get(f"/api/sets/{self.flashcard_set.pk}/")
+        self.assertEqual([m["id"] for m in response.json()["cards"][0]["media"]], [data["id"]])
+
+    def test_complete_without_upload_conflicts(self):
+        response = self.client.post(
+            f"/api/cards/{self.card.pk}/media/", {"content_type": "image/png", "size": 4}, format="json"
+        )
+        response = self.client.post(f"/api/media/{response.json()['id']}/complete/")
+        self.assertEqual(response.status_code, 409)
+
+    def test_delete_removes_object(self):
+        data = self._upload()
+        self.client.post(f"/api/media/{data['id']}/complete/")
+        response = self.client.delete(f"/api/media/{data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.s3.list_objects_v2(Bucket="test-media")["KeyCount"], 0)
+
+    def test_clone_copies_media(self):
+        data = self._upload()
+        self.client.post(f"/api/media/{data['id']}/complete/")
+
+        response = self.client.post(f"/api/sets/{self.flashcard_set.pk}/clone/", {}, format="json")
+        self.assertEqual(response.status_code, 201)
+        clone = FlashcardSet.objects.get(pk=response.json()["id"])
+        copy = CardMedia.objects.get(card__set=clone)
+        self.assertEqual(copy.status, CardMedia.STATUS_READY)
+        self.assertNotEqual(copy.key, CardMedia.objects.get(pk=data["id"]).key)
+        body = self.s3.get_object(Bucket="test-media", Key=copy.key)["Body"].read()
+        self.assertEqual(body, b"\x89PNG")
+
+    def test_cleanup_media(self):
+        ready = self._upload()
+        self.client.post(f"/api/media/{ready['id']}/complete/")
+        stale = self._upload()
+        CardMedia.objects.filter(pk=stale["id"]).update(created_at=timezone.now() - timedelta(days=2))
+        fresh = self._upload()
+        self.s3.put_object(Bucket="test-media", Key="cards/0/orphan", Body=b"x")
+
+        call_command("cleanup_media", stdout=io.StringIO())
+
+        self.assertEqual(
+            set(CardMedia.objects.values_list("pk", flat=True)), {ready["id"], fresh["id"]}
+        )
+        keys = set(get_media_storage().iter_keys("cards/"))
+        self.assertEqual(keys, set(CardMedia.objects.values_list("key", flat=True)))
+        self.assertEqual(len(keys), 2)
+
+
+class AdminChangelistTests(TestCase):
+    """Changelists run a fixed number of queries however many rows and related rows exist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        users = User.objects.bulk_create(User(username=f"user-{i}") for i in range(50))
+        sets = FlashcardSet.objects.bulk_create(
+            FlashcardSet(user=user, name=f"Deck {i}") for i, user in enumerate(users * 4)
+        )
+        Flashcard.objects.bulk_create(
+            Flashcard(set=s, owner_id=s.user_id, front="front " * 20, back="back " * 200)
+            for s in sets
+            for _ in range(10)
+        )
+        cls.flashcard_set = sets[0]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _get(self, path, queries):
+        # Session, user, row count, page rows.
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_flashcard_changelist(self):
+        response = self._get("/admin/api/flashcard/", 4)
+        self.assertContains(response, 'name="set_id"')
+
+    def test_flashcard_changelist_skips_card_backs(self):
+        with CaptureQueriesContext(connections["default"]) as captured:
+            self.client.get("/admin/api/flashcard/")
+        self.assertFalse([q for q in captured.captured_queries if '"api_flashcard"."back"' in q["sql"]])
+
+    def test_flashcard_changelist_filtered_by_set(self):
+        response = self._get(f"/admin/api/flashcard/?set_id={self.flashcard_set.pk}", 4)
+        self.assertContains(response, "10 flashcards")
+
+    def test_flashcardset_changelist(self):
+        response = self._get("/admin/api/flashcardset/", 4)
+        self.assertContains(response, 'name="user_id"')
+
+    def test_flashcardset_changelist_ordered_by_card_count(self):
+        self._get("/admin/api/flashcardset/?o=3", 4)
+
+    def test_input_filter_ignores_non_numeric_ids(self):
+        # queryset.none(): no count or row query at all.
+        response = self._get("/admin/api/flashcard/?set_id=abc", 2)
+        self.assertContains(response, "0 flashcards")
+
+
+@override_settings(SHARED_SETS_PAGE_SIZE=2)
+class SharedSetListTests(TestCase):
+    """GET /api/sets/?shared=true counts cards in SQL and pages with a cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(username="author")
+        for i in range(3):
+            flashcard_set = FlashcardSet.objects.create(user=owner, name=f"Shared {i}", is_shared=True)
+            Flashcard.objects.bulk_create(
+                Flashcard(set=flashcard_set, owner_id=owner.pk, front="f", back="b") for _ in range(i + 1)
+            )
+        FlashcardSet.objects.create(user=owner, name="Private")
+        cls.user = User.objects.create(username="reader")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_with_card_counts(self):
+        with CaptureQueriesContext(connections["default"]) as captured:
+            first = self._get("/api/sets/?shared=true")
+        self.assertFalse([q for q in captured.captured_queries if 'FROM "api_flashcard" ' in q["sql"]])
+        self.assertEqual(
+            [(s["name"], s["card_count"]) for s in first["results"]], [("Shared 2", 3), ("Shared 1", 2)]
+        )
+        second = self._get(first["next"])
+        self.assertEqual([(s["name"], s["card_count"]) for s in second["results"]], [("Shared 0", 1)])
+        self.assertIsNone(second["next"])
+
+    def test_own_sets_are_not_paginated(self):
+        self.assertEqual(self._get("/api/sets/"), [])
+
+
+class CompressionTests(TestCase):
+    """API payloads are compressed; HTML (CSRF tokens, BREACH) never is."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        Flashcard.objects.bulk_create(
+            Flashcard(set=flashcard_set, owner_id=self.user.pk, front="front " * 20, back="back " * 20)
+            for _ in range(20)
+        )
+        self.flashcard_set = flashcard_set
+
+    def test_json_is_compressed(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f"/api/sets/{self.flashcard_set.pk}/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_html_is_not_compressed(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/api/flashcard/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class StudyBatchColumnsTests(TestCase):
+    """PATCH /api/sets/:id/cards/study/batch/ with columns."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="student")
+        self.flashcard_set = FlashcardSet.objects.create(user=self.user, name="Deck")
+        self.card = FlashcardRepository.create(self.flashcard_set, front="f", back="b")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _patch(self, due_at):
+        return self.client.patch(
+            f"/api/sets/{self.flashcard_set.pk}/cards/study/batch/",
+            {"columns": {"id": [self.card.pk], "due_at": [due_at]}},
+            format="json",
+        )
+
+    def test_due_at_epoch(self):
+        response = self._patch(86400)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()[0]["due_at"].startswith("1970-01-02T00:00:00"))
+
+    def test_out_of_range_due_at_is_rejected(self):
+        response = self._patch(1e20)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("due_at", response.json()["columns"])
+
+
+class QueryPlanTests(TestCase):
+    """The check_query_plans gate, against the committed snapshot for this database."""
+
+    def test_plans_match_snapshot(self):
+        path = check_query_plans.SNAPSHOT_DIR / f"{connection.vendor}.json"
+        expected = json.loads(path.read_text())
+        regressions, _ = check_query_plans._compare(expected, check_query_plans._capture_plans())
+        self.assertEqual(regressions, [])
+
+    def test_full_scans(self):
+        plans = [
+            ["SCAN api_job"],
+            ["SCAN api_flashcardset USING INDEX flashcardset_shared_idx"],
+            ["SEARCH api_flashcard USING INDEX flashcard_owner_set_idx (owner_id=? AND set_id=?)"],
+            ["MATERIALIZE src", "  SCAN (subquery-N)", "SCAN src", "SCAN N CONSTANT ROWS"],
+            ["Limit", "  Index Scan on api_cardmedia using api_cardmedia_pkey (full)"],
+            ["Seq Scan on api_flashcard"],
+        ]
+        self.assertEqual(
+            check_query_plans._full_scans(plans),
+            {
+                "api_job",
+                "api_flashcardset using flashcardset_shared_idx",
+                "api_cardmedia using api_cardmedia_pkey",
+                "api_flashcard",
+            },
+        )
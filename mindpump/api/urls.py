@@ -1,7 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import FlashcardSetViewSet, FlashcardStudyView
+from .views import (
+    FlashcardSetViewSet,
+    FlashcardStudyView,
+    CardMediaCreateView,
+    CardMediaDetailView,
+    CardMediaCompleteView,
+    JobDetailView,
+    BatchView,
+)
 
 router = DefaultRouter()
 router.register(r"sets", FlashcardSetViewSet, basename="flashcardset")
@@ -9,4 +17,9 @@ router.register(r"sets", FlashcardSetViewSet, basename="flashcardset")
 urlpatterns = [
     path("", include(router.urls)),
     path("cards/<int:pk>/study/", FlashcardStudyView.as_view(), name="card-study"),
+    path("cards/<int:pk>/media/", CardMediaCreateView.as_view(), name="card-media"),
+    path("media/<int:pk>/", CardMediaDetailView.as_view(), name="media-detail"),
+    path("media/<int:pk>/complete/", CardMediaCompleteView.as_view(), name="media-complete"),
+    path("jobs/<int:pk>/", JobDetailView.as_view(), name="job-detail"),
+    path("batch/", BatchView.as_view(), name="batch"),
 ]
@@ -1,13 +1,33 @@
+import io
+import json
+import logging
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.urls import Resolver404, resolve, reverse
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import AllowAny, SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 
+from mindpump import db_routers
+
+from . import exports, jobs
+from .media_storage import copy_clone_media, get_media_storage
 from .models import FlashcardSet, Flashcard
 
-from .repositories import FlashcardSetRepository, FlashcardRepository
+from .repositories import (
+    FlashcardSetRepository,
+    FlashcardRepository,
+    CardProgressRepository,
+    JobRepository,
+    CardMediaRepository,
+)
 from .serializers import (
     FlashcardSetSerializer,
     FlashcardSetListSerializer,
@@ -17,16 +37,94 @@ from .serializers import (
     DeleteCardsBatchSerializer,
     StudyStatusUpdateSerializer,
     StudyStatusBatchSerializer,
+    CloneSetSerializer,
+    MoveCardsSerializer,
+    JobSerializer,
+    BatchSerializer,
+    CardMediaSerializer,
+    CreateCardMediaSerializer,
+    card_columns,
 )
 
-class FlashcardSetViewSet(ModelViewSet):
+logger = logging.getLogger(__name__)
+
+# ?layout=columnar: study state as parallel arrays (see serializers.card_columns).
+LAYOUT_COLUMNAR = "columnar"
+
+
+def _can_read_card(card, user):
+    """Own cards, cards of ownerless sets, and cards of shared sets."""
+    return card.set.is_shared or _can_edit_card(card, user)
+
+
+def _can_edit_card(card, user):
+    return card.set.user_id is None or getattr(user, "pk", None) == card.set.user_id
+
+
+def _job_accepted(job):
+    """202 response for work handed to a background job; poll the Location URL."""
+    return Response(
+        JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": reverse("job-detail", args=[job.pk])},
+    )
+
+
+class ReplicaRoutingMixin:
+    """
+    Serve safe-method requests from the read replica (when configured). A successful
+    write pins the client to the primary for REPLICA_STICKY_SECONDS (signed cookie,
+    or X-Read-Primary header) so it reads its own writes.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            if db_routers.is_sticky(request):
+                return super().dispatch(request, *args, **kwargs)
+            with db_routers.read_from_replica():
+                return super().dispatch(request, *args, **kwargs)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code < 400:
+            db_routers.mark_sticky(response)
+        return response
+
+
+class SharedSetPagination(CursorPagination):
+    ordering = "-updated_at"
+
+    def get_page_size(self, request):
+        return settings.SHARED_SETS_PAGE_SIZE
+
+
+class FlashcardSetViewSet(ReplicaRoutingMixin, ModelViewSet):
     """
     Sets: list, create, retrieve, update, destroy. No auth for MVP.
+    Shared sets (is_shared) of other users can be read, studied and cloned, not edited.
+    List shared sets with GET /api/sets/?shared=true: { "next", "previous", "results" },
+    follow "next" for further pages.
     """
 
+    # Actions allowed on another user's shared set.
+    shared_actions = {"retrieve", "clone", "export", "update_study_batch"}
+    # Actions whose response includes the set's cards; the rest skip the card prefetch.
+    card_actions = {"retrieve"}
+
+    def _shared_listing(self):
+        return self.request.query_params.get("shared") in ("1", "true")
+
     def get_queryset(self):
+        if self._shared_listing():
+            return FlashcardSetRepository.list_shared()
         return FlashcardSetRepository.list_by_user(self.request.user)
 
+    @property
+    def paginator(self):
+        # Only the shared catalogue, which grows with every user's sets, is paginated.
+        if not hasattr(self, "_paginator"):
+            shared = self.action == "list" and self._shared_listing()
+            self._paginator = SharedSetPagination() if shared else None
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action == "list":
             return FlashcardSetListSerializer
@@ -36,18 +134,34 @@ class FlashcardSetViewSet(ModelViewSet):
         obj = FlashcardSetRepository.get_by_id_and_user(
             pk=self.kwargs["pk"],
             user=self.request.user,
+            include_shared=self.action in self.shared_actions,
+            prefetch_cards=self.action in self.card_actions,
         )
         if obj is None:
             from rest_framework.exceptions import NotFound
             raise NotFound()
         return obj
 
+    def retrieve(self, request, *args, **kwargs):
+        """GET /api/sets/:id/  ?layout=columnar returns "cards" as parallel arrays."""
+        if request.query_params.get("layout") != LAYOUT_COLUMNAR:
+            return super().retrieve(request, *args, **kwargs)
+        obj = self.get_object()
+        data = FlashcardSetListSerializer(obj).data
+        data["cards"] = card_columns(obj.cards.all(), content=True)
+        return Response(data)
+
     def perform_update(self, serializer):
         obj = serializer.instance
         FlashcardSetRepository.update(
             obj,
             name=serializer.validated_data.get("name"),
             description=serializer.validated_data.get("description"),
+            is_shared=serializer.validated_data.get("is_shared"),
+        )
+        # Re-read so the response includes cards with this user's study progress.
+        serializer.instance = FlashcardSetRepository.get_by_id_and_user(
+            pk=obj.pk, user=self.request.user
         )
 
     def perform_destroy(self, instance):
@@ -55,11 +169,32 @@ class FlashcardSetViewSet(ModelViewSet):
 
     @action(detail=True, methods=["post"], url_path="cards/batch")
     def create_cards_batch(self, request, pk=None):
-        """POST /api/sets/:id/cards/batch/  Body: { "cards": [ { "front", "back" }, ... ] }"""
+        """
+        POST /api/sets/:id/cards/batch/  Body: { "cards": [ { "front", "back" }, ... ], "on_duplicate?" }
+        on_duplicate: allow (default), skip or update cards whose content already exists.
+        More than JOBS_INLINE_MAX_CARDS cards, with a JOBS_BACKEND: 202 with a job (see
+        GET /api/jobs/:id/).
+        """
         obj = self.get_object()
         ser = CreateCardsBatchSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        created = FlashcardRepository.create_many(obj, ser.validated_data["cards"])
+        cards = ser.validated_data["cards"]
+        if jobs.backend_configured() and len(cards) > settings.JOBS_INLINE_MAX_CARDS:
+            job = jobs.enqueue(
+                request.user,
+                jobs.KIND_IMPORT_CARDS,
+                {
+                    "set_id": obj.pk,
+                    "cards": cards,
+                    "on_duplicate": ser.validated_data["on_duplicate"],
+                },
+                total=len(cards),
+            )
+            return _job_accepted(job)
+        created = FlashcardRepository.create_many(
+            obj, cards, on_duplicate=ser.validated_data["on_duplicate"]
+        )
+        CardMediaRepository.attach(created)
         return Response(
             FlashcardSerializer(created, many=True).data,
             status=status.HTTP_201_CREATED,
@@ -72,6 +207,8 @@ class FlashcardSetViewSet(ModelViewSet):
         ser = EditCardsBatchSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
         updated = FlashcardRepository.update_batch(obj, ser.validated_data["cards"])
+        CardProgressRepository.attach(updated, request.user)
+        CardMediaRepository.attach(updated)
         return Response(FlashcardSerializer(updated, many=True).data)
 
     @action(detail=True, methods=["delete"], url_path="cards/batch")
@@ -85,35 +222,348 @@ class FlashcardSetViewSet(ModelViewSet):
         )
         return Response({"deleted": deleted_count}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["post"], url_path="cards/move")
+    def move_cards(self, request, pk=None):
+        """POST /api/sets/:id/cards/move/  Body: { "target_set_id", "card_ids": [ 1, 2, ... ] }"""
+        obj = self.get_object()
+        ser = MoveCardsSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        target = FlashcardSetRepository.get_by_id_and_user(
+            pk=ser.validated_data["target_set_id"],
+            user=request.user,
+            prefetch_cards=False,
+        )
+        if target is None:
+            return Response(
+                {"detail": "Target set not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        moved_count = FlashcardRepository.move_many(
+            obj, target, ser.validated_data["card_ids"]
+        )
+        return Response({"moved": moved_count}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def clone(self, request, pk=None):
+        """
+        POST /api/sets/:id/clone/  Body: { "name?", "reset_study?" }
+        Responds with the new set without its cards (fetch GET /api/sets/:id/ for those).
+        Sets with more than JOBS_INLINE_MAX_CARDS cards, with a JOBS_BACKEND: 202 with a job.
+        """
+        obj = self.get_object()
+        ser = CloneSetSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        if jobs.backend_configured():
+            card_count = FlashcardRepository.cards_of(obj).count()
+            if card_count > settings.JOBS_INLINE_MAX_CARDS:
+                job = jobs.enqueue(
+                    request.user,
+                    jobs.KIND_CLONE_SET,
+                    {"set_id": obj.pk, **ser.validated_data},
+                    total=card_count,
+                )
+                return _job_accepted(job)
+        new_set = FlashcardSetRepository.clone(
+            obj,
+            request.user,
+            name=ser.validated_data.get("name"),
+            reset_study=ser.validated_data["reset_study"],
+        )
+        copy_clone_media(obj, new_set, request.user)
+        return Response(
+            FlashcardSetListSerializer(new_set).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=["get", "post"])
+    def export(self, request, pk=None):
+        """
+        GET /api/sets/:id/export/
+        The set detail payload, encoded EXPORT_CHUNK_SIZE cards at a time. On Lambda the
+        response is buffered whole, so it is subject to the response size limit.
+        POST /api/sets/:id/export/
+        202 with a job that writes the same payload to object storage; GET /api/jobs/:id/
+        returns a download "url" once it has succeeded. Use this for large decks.
+        """
+        obj = FlashcardSetRepository.get_by_id_and_user(
+            pk=pk,
+            user=request.user,
+            include_shared=True,
+            prefetch_cards=False,
+        )
+        if obj is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == "POST":
+            job = jobs.enqueue(
+                request.user,
+                jobs.KIND_EXPORT_SET,
+                {"set_id": obj.pk},
+                total=FlashcardRepository.cards_of(obj).count(),
+            )
+            return _job_accepted(job)
+        return StreamingHttpResponse(
+            exports.iter_set_json(obj, request.user),
+            content_type="application/json",
+        )
+
     @action(detail=True, methods=["patch"], url_path="cards/study/batch")
     def update_study_batch(self, request, pk=None):
-        """PATCH /api/sets/:id/cards/study/batch/  Body: { "cards": [ { "id", "interval_days?", ... }, ... ] }"""
+        """
+        PATCH /api/sets/:id/cards/study/batch/
+        Body: { "cards": [ { "id", "interval_days?", ... }, ... ] }
+           or { "columns": { "id": [...], "interval_days?": [...], "due_at?": [epoch, ...], ... } }
+        ?layout=columnar responds with { "columns": { ... } } instead of a card list.
+        """
         obj = self.get_object()
         ser = StudyStatusBatchSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        updated = FlashcardRepository.update_study_batch(
-            obj, ser.validated_data["cards"]
+        updated = CardProgressRepository.update_batch(
+            obj, request.user, ser.validated_data["cards"]
         )
+        if request.query_params.get("layout") == LAYOUT_COLUMNAR:
+            return Response({"columns": card_columns(updated)})
+        CardMediaRepository.attach(updated)
         return Response(FlashcardSerializer(updated, many=True).data)
 
 
-class FlashcardStudyView(APIView):
+class FlashcardStudyView(ReplicaRoutingMixin, APIView):
     """
     PATCH /api/cards/:id/study/  Body: { "interval_days?", "ease_factor?", "due_at?", "lapses?", "reps?" }
-    Update one card's study status.
+    Update the requesting user's study status for one card (own or shared set).
     """
 
     def patch(self, request, pk):
-        card = FlashcardRepository.get_by_id(pk)
+        # Own cards are looked up by owner (partition key) first; shared cards need a full lookup.
+        card = FlashcardRepository.get_by_id(pk, owner=request.user) or FlashcardRepository.get_by_id(pk)
         if card is None:
             return Response(
                 {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
             )
-        if card.set.user_id is not None and getattr(request.user, "pk", None) != card.set.user_id:
+        if not _can_read_card(card, request.user):
             return Response(
                 {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
             )
         ser = StudyStatusUpdateSerializer(data=request.data, partial=True)
         ser.is_valid(raise_exception=True)
-        FlashcardRepository.update_study(card, ser.validated_data)
+        CardProgressRepository.update(card, request.user, ser.validated_data)
         return Response(FlashcardSerializer(card).data)
+
+
+class CardMediaCreateView(APIView):
+    """
+    POST /api/cards/:id/media/  Body: { "content_type", "size" }
+    Register an attachment and get a presigned S3 PUT URL. Upload the bytes there
+    (with the same Content-Type), then POST /api/media/:id/complete/.
+    """
+
+    def post(self, request, pk):
+        card = FlashcardRepository.get_by_id(pk, owner=request.user) or FlashcardRepository.get_by_id(pk)
+        if card is None or not _can_edit_card(card, request.user):
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        ser = CreateCardMediaSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        media = CardMediaRepository.create(card, request.user, **ser.validated_data)
+        upload_url = get_media_storage().upload_url(
+            media.key, content_type=media.content_type, size=media.size
+        )
+        return Response(
+            {
+                **CardMediaSerializer(media).data,
+                "upload_url": upload_url,
+                "upload_headers": {"Content-Type": media.content_type},
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class CardMediaDetailView(APIView):
+    """
+    GET /api/media/:id/  Media metadata and a presigned download URL.
+    DELETE /api/media/:id/  Remove the attachment and its object.
+    """
+
+    def get(self, request, pk):
+        media = CardMediaRepository.get_by_id(pk)
+        if media is None or not _can_read_card(media.card, request.user):
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        data = CardMediaSerializer(media).data
+        if media.status == media.STATUS_READY:
+            data["url"] = get_media_storage().download_url(media.key)
+        return Response(data)
+
+    def delete(self, request, pk):
+        media = CardMediaRepository.get_by_id(pk)
+        if media is None or not _can_edit_card(media.card, request.user):
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        get_media_storage().delete([media.key])
+        CardMediaRepository.delete(media)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CardMediaCompleteView(APIView):
+    """POST /api/media/:id/complete/  Confirm the upload finished; the media becomes visible on the card."""
+
+    def post(self, request, pk):
+        media = CardMediaRepository.get_by_id(pk)
+        if media is None or not _can_edit_card(media.card, request.user):
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        size = get_media_storage().size(media.key)
+        if size is None:
+            return Response(
+                {"detail": "Upload not found."}, status=status.HTTP_409_CONFLICT
+            )
+        CardMediaRepository.mark_ready(media, size)
+        return Response(CardMediaSerializer(media).data)
+
+
+class JobDetailView(APIView):
+    """
+    GET /api/jobs/:id/
+    Status and progress of a background job. Always read from the primary so
+    polling sees updates without replica lag. A finished export also has a download "url".
+    """
+
+    def get(self, request, pk):
+        job = JobRepository.get_by_id_and_user(pk, request.user)
+        if job is None:
+            return Response(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        data = JobSerializer(job).data
+        if job.kind == jobs.KIND_EXPORT_SET and job.status == job.STATUS_SUCCEEDED:
+            data["url"] = get_media_storage().download_url(job.result["key"])
+        return Response(data)
+
+
+class _RollbackBatch(Exception):
+    pass
+
+
+class BatchView(APIView):
+    """
+    POST /api/batch/  Body: { "requests": [ { "method", "path", "body?" }, ... ], "atomic?" }
+    Runs each sub-request in-process through the API URLconf, reusing this request's
+    authentication and DB connection. Responds with { "responses": [ { "status", "body" }, ... ],
+    "committed" }. With atomic, all sub-requests share one transaction that is rolled
+    back (and the batch stopped) at the first response with status >= 400.
+    """
+
+    def post(self, request):
+        ser = BatchSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        sub_requests = ser.validated_data["requests"]
+        atomic = ser.validated_data["atomic"]
+
+        responses = []
+        # Inside a transaction, or once anything was written, reads must see the writes.
+        state = {"read_primary": atomic, "wrote": False}
+        committed = True
+        if atomic:
+            try:
+                with transaction.atomic():
+                    for sub in sub_requests:
+                        result = self._dispatch(request, sub, state)
+                        responses.append(result)
+                        if result["status"] >= 400:
+                            raise _RollbackBatch()
+            except _RollbackBatch:
+                committed = False
+        else:
+            responses = [self._dispatch(request, sub, state) for sub in sub_requests]
+
+        response = Response({"responses": responses, "committed": committed})
+        if state["wrote"] and committed:
+            db_routers.mark_sticky(response)
+        return response
+
+    def _dispatch(self, request, sub, state):
+        path, query = _split_api_path(sub["path"])
+        try:
+            match = resolve(path, urlconf="mindpump.api.urls")
+        except Resolver404:
+            return {"status": status.HTTP_404_NOT_FOUND, "body": {"detail": "Not found."}}
+        if getattr(match.func, "view_class", None) is BatchView:
+            return {"status": status.HTTP_400_BAD_REQUEST, "body": {"detail": "Batches cannot be nested."}}
+
+        sub_request = _build_sub_request(request, sub["method"], path, query, sub.get("body"))
+        if state["read_primary"]:
+            sub_request.META[db_routers.STICKY_HEADER] = "1"
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception:
+            # One failing sub-request must not discard the responses of those that ran
+            # (and, without atomic, committed) before it.
+            logger.exception("Batch sub-request %s %s failed", sub["method"], path)
+            if sub["method"] != "GET":
+                # It may have written before failing.
+                state["read_primary"] = state["wrote"] = True
+            return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"detail": "Internal server error."}}
+
+        if response.streaming:
+            return {"status": status.HTTP_400_BAD_REQUEST, "body": {"detail": "Streaming endpoints are not supported in a batch."}}
+        if sub["method"] != "GET" and response.status_code < 400:
+            state["read_primary"] = state["wrote"] = True
+        result = {"status": response.status_code, "body": _response_body(response)}
+        if response.has_header("Location"):
+            result["location"] = response["Location"]
+        return result
+
+
+def _split_api_path(raw_path):
+    """'/api/sets/1/?x=1' or 'sets/1/?x=1' -> ('/sets/1/', 'x=1'), relative to the API URLconf."""
+    parts = urlsplit(raw_path)
+    path = parts.path
+    if path.startswith("/api/"):
+        path = path[len("/api"):]
+    if not path.startswith("/"):
+        path = "/" + path
+    return path, parts.query
+
+
+def _build_sub_request(request, method, path, query, body):
+    """An HttpRequest for one sub-request, authenticated as the outer request's user."""
+    raw = request._request
+    payload = b"" if body is None else json.dumps(body).encode()
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = "/api" + path
+    sub.META = {
+        key: value
+        for key, value in raw.META.items()
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH", "QUERY_STRING", "HTTP_ACCEPT")
+    }
+    sub.META.update(
+        REQUEST_METHOD=method,
+        PATH_INFO=sub.path_info,
+        QUERY_STRING=query,
+        CONTENT_TYPE="application/json",
+        CONTENT_LENGTH=str(len(payload)),
+        HTTP_ACCEPT="application/json",
+    )
+    sub.GET = QueryDict(query)
+    sub.COOKIES = raw.COOKIES
+    sub._stream = io.BytesIO(payload)
+    sub._read_started = False
+    # DRF uses these instead of running the authenticators again.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _response_body(response):
+    if isinstance(response, Response):
+        # Never rendered; data is None for bodiless responses such as 204.
+        return response.data
+    if not response.content:
+        return None
+    try:
+        return json.loads(response.content)
+    except ValueError:
+        return response.content.decode(response.charset or "utf-8", errors="replace")
@@ -0,0 +1,75 @@
+"""
+Read-replica routing. Reads go to the "replica" alias only inside read_from_replica()
+(entered by the API views for safe-method requests) and only when that alias is
+configured; everything else, including all writes, uses "default".
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+STICKY_COOKIE_NAME = "mp_read_primary"
+# Clients without a cookie jar can send this header to force reads from the primary.
+STICKY_HEADER = "HTTP_X_READ_PRIMARY"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+@contextmanager
+def read_from_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def is_sticky(request):
+    """True if the client wrote recently and must read its own writes from the primary."""
+    if request.META.get(STICKY_HEADER):
+        return True
+    value = request.get_signed_cookie(
+        STICKY_COOKIE_NAME,
+        default=None,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+    )
+    return value is not None
+
+
+def mark_sticky(response):
+    """Pin the client's reads to the primary for REPLICA_STICKY_SECONDS."""
+    response.set_signed_cookie(
+        STICKY_COOKIE_NAME,
+        "1",
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite="Lax",
+    )
+    return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is populated by replication, never migrated directly.
+        return db == DEFAULT_DB_ALIAS
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "mindpump.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -100,6 +101,31 @@ else:
         }
     }
 
+# Optional read replica. Safe-method API requests read from it; see mindpump/db_routers.py.
+# PostgreSQL: DB_REPLICA_HOST (same credentials as the primary). SQLite: DB_REPLICA_NAME,
+# a second database file as a local stand-in.
+_db_replica_host = os.environ.get("DB_REPLICA_HOST", "").strip()
+_db_replica_name = os.environ.get("DB_REPLICA_NAME", "").strip()
+if _db_host and _db_replica_host:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": _db_replica_host,
+        "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+elif not _db_host and _db_replica_name:
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / _db_replica_name,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["mindpump.db_routers.ReplicaRouter"]
+
+# After a write, the client reads from the primary for this many seconds so it sees
+# its own changes despite replication lag.
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -153,4 +179,62 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # JSON by default; MessagePack when the client sends/accepts application/msgpack.
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "mindpump.api.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+        "mindpump.api.parsers.MessagePackParser",
+    ],
 }
+
+# Background jobs (see mindpump/api/jobs.py). With JOBS_QUEUE_URL set, jobs go to SQS
+# and run in the Lambda SQS handler. Without a backend there is no worker: large imports
+# and clones run inline in the request, and export jobs run in-process. JOBS_BACKEND may
+# also name DatabaseBackend (with `manage.py run_jobs` running) or InlineBackend.
+JOBS_QUEUE_URL = os.environ.get("JOBS_QUEUE_URL", "")
+JOBS_BACKEND = os.environ.get(
+    "JOBS_BACKEND", "mindpump.api.jobs.SQSBackend" if JOBS_QUEUE_URL else ""
+)
+# With a JOBS_BACKEND, requests touching more cards than this return 202 with a job
+# instead of running inline.
+JOBS_INLINE_MAX_CARDS = int(os.environ.get("JOBS_INLINE_MAX_CARDS", "1000"))
+# Cards written per transaction (and per progress update) inside a job.
+JOBS_CHUNK_SIZE = int(os.environ.get("JOBS_CHUNK_SIZE", "500"))
+# A running job with no progress for this long is assumed dead (e.g. its Lambda timed
+# out) and is picked up again; keep it above the worker's timeout (Lambda max: 900s).
+JOBS_STALE_SECONDS = int(os.environ.get("JOBS_STALE_SECONDS", "900"))
+
+# Response compression (mindpump/middleware.py): brotli or gzip per Accept-Encoding.
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+# Only these are compressed; never text/html (admin, browsable API), which holds CSRF tokens.
+COMPRESSION_CONTENT_TYPES = ("application/json", "application/msgpack")
+# Cards read and encoded per chunk by set exports (GET and POST /api/sets/:id/export/).
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "500"))
+# Export job files go to MEDIA_BUCKET under this prefix (expire them with a lifecycle rule).
+EXPORT_KEY_PREFIX = "exports/"
+
+# Page size of the shared set listing (GET /api/sets/?shared=true, cursor-paginated).
+SHARED_SETS_PAGE_SIZE = int(os.environ.get("SHARED_SETS_PAGE_SIZE", "50"))
+
+# Maximum sub-requests per POST /api/batch/.
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "25"))
+
+# Card media (mindpump/api/media_storage.py): presigned S3 uploads/downloads.
+MEDIA_STORAGE = os.environ.get("MEDIA_STORAGE", "mindpump.api.media_storage.S3MediaStorage")
+MEDIA_BUCKET = os.environ.get("MEDIA_BUCKET", "")
+# For an S3-compatible local stand-in (e.g. MinIO); empty uses AWS.
+MEDIA_S3_ENDPOINT_URL = os.environ.get("MEDIA_S3_ENDPOINT_URL", "")
+MEDIA_KEY_PREFIX = "cards/"
+MEDIA_URL_EXPIRES = int(os.environ.get("MEDIA_URL_EXPIRES", "900"))
+MEDIA_MAX_BYTES = int(os.environ.get("MEDIA_MAX_BYTES", str(10 * 1024 * 1024)))
+MEDIA_ALLOWED_TYPES = ["image/", "audio/"]
+# Pending uploads older than this are removed by `manage.py cleanup_media`.
+MEDIA_PENDING_TTL_HOURS = int(os.environ.get("MEDIA_PENDING_TTL_HOURS", "24"))